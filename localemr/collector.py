@@ -0,0 +1,126 @@
+"""
+Status messages from the fork/exec processes are consumed here as soon as they arrive, rather than
+draining every cluster's queues on each API call. The collector only records which clusters have
+pending updates, the backend then applies those updates for the clusters a request actually touches.
+Updates are coalesced as they arrive, so only the latest status of each step and a single merged
+ClusterSubset are kept per cluster no matter how long the clusters go without being described.
+"""
+import threading
+from collections import defaultdict
+from multiprocessing import Queue
+from typing import Callable, Iterable, List, Optional, Tuple
+from localemr.common import ClusterSubset, StepStatusUpdate
+
+
+def merge_cluster_subsets(older: Optional[ClusterSubset], newer: ClusterSubset) -> ClusterSubset:
+    """Fields left unset on the newer subset keep their older value, the same way they are applied to a cluster."""
+    if older is None:
+        return newer
+    for attribute, value in vars(newer).items():
+        if value is not None:
+            setattr(older, attribute, value)
+    return older
+
+
+class StatusCollector:
+
+    def __init__(self, on_cluster_status: Optional[Callable[[ClusterSubset], None]] = None,
+                 on_step_status: Optional[Callable[[StepStatusUpdate], None]] = None):
+        """
+        Parameters
+        ----------
+        on_cluster_status : Called from the collector thread with every ClusterSubset as it arrives,
+            for bookkeeping which can't wait for the next API call.
+        on_step_status : Likewise called with every StepStatusUpdate as it arrives.
+        """
+        self.on_cluster_status = on_cluster_status
+        self.on_step_status = on_step_status
+        self.step_status_queue = None
+        self.cluster_status_queue = None
+        self._lock = threading.Lock()
+        self._pending_steps = defaultdict(dict)
+        self._pending_clusters = {}
+        self._dirty = set()
+        self._threads = []
+
+    @property
+    def started(self) -> bool:
+        return bool(self._threads)
+
+    def start(self):
+        """
+        Lazily create the status queues and the threads reading them, so that backends
+        for regions which never run a cluster don't hold on to any pipes.
+        """
+        if self.started:
+            return
+        self.step_status_queue = Queue()
+        self.cluster_status_queue = Queue()
+        for queue, record, callback in ((self.step_status_queue, self._record_step, self.on_step_status),
+                                        (self.cluster_status_queue, self._record_cluster, self.on_cluster_status)):
+            thread = threading.Thread(target=self._collect, args=(queue, record, callback), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        if not self.started:
+            return
+        self.step_status_queue.put(None)
+        self.cluster_status_queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _collect(self, queue: Queue, record: Callable, callback: Optional[Callable]):
+        while True:
+            message = queue.get()
+            if message is None:
+                return
+            if callback is not None:
+                callback(message)
+            with self._lock:
+                record(message)
+                self._dirty.add(message.cluster_id)
+
+    def _record_step(self, step_status_update: StepStatusUpdate):
+        self._pending_steps[step_status_update.cluster_id][step_status_update.id] = step_status_update
+
+    def _record_cluster(self, cluster_subset: ClusterSubset):
+        self._pending_clusters[cluster_subset.cluster_id] = merge_cluster_subsets(
+            self._pending_clusters.get(cluster_subset.cluster_id), cluster_subset,
+        )
+
+    def discard(self, cluster_id: str):
+        """Drops the pending updates of a cluster which the API no longer knows about."""
+        with self._lock:
+            self._dirty.discard(cluster_id)
+            self._pending_steps.pop(cluster_id, None)
+            self._pending_clusters.pop(cluster_id, None)
+
+    def drain(self, cluster_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, list, Optional[ClusterSubset]]]:
+        """
+        Parameters
+        ----------
+        cluster_ids : The clusters to take the pending updates of, all dirty clusters if None
+
+        Returns
+        -------
+        A list of (cluster_id, latest update of each step, merged cluster update or None),
+        for each of the requested clusters which had pending updates.
+        """
+        # Made a set before taking the lock, every API call asks for every cluster of its region
+        requested = None if cluster_ids is None else frozenset(cluster_ids)
+        with self._lock:
+            if requested is None:
+                dirty = list(self._dirty)
+            else:
+                dirty = list(self._dirty & requested)
+            updates = []
+            for cluster_id in dirty:
+                self._dirty.discard(cluster_id)
+                updates.append((
+                    cluster_id,
+                    list(self._pending_steps.pop(cluster_id, {}).values()),
+                    self._pending_clusters.pop(cluster_id, None),
+                ))
+            return updates
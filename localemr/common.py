@@ -3,24 +3,41 @@ TODO: This is a shittily named module to solve circular dependencies. Make it be
 """
 import os
 import re
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 from distutils.version import StrictVersion
 from xml.sax.saxutils import escape
 import pytz
 from moto.emr.models import FakeStep
 from moto.emr.exceptions import EmrError
+from localemr.sizing import ClusterSize
 
 
 class ClusterSubset:
-    def __init__(self, state, name=None, release_label=None, start_datetime=None, ready_datetime=None,
-                 end_datetime=None):
+    """
+    The part of a cluster which is passed between the API and the processes running it. A state of None
+    is used to modify a running cluster, for example its step_concurrency_level.
+    """
+    def __init__(self, state, cluster_id=None, name=None, release_label=None, start_datetime=None, ready_datetime=None,
+                 end_datetime=None, step_concurrency_level=None, size: Optional[ClusterSize] = None,
+                 worker_count: Optional[int] = None, spark_conf: Optional[Dict[str, str]] = None,
+                 reattach: Optional[bool] = None, state_change_reason: Optional[str] = None):
+        self.cluster_id = cluster_id
         self.name = name
         self.release_label = release_label
         self.state = state
         self.start_datetime = start_datetime
         self.ready_datetime = ready_datetime
         self.end_datetime = end_datetime
+        self.step_concurrency_level = step_concurrency_level
+        self.size = size
+        # The number of core and task instances
+        self.worker_count = worker_count
+        # The Spark configuration given to the steps of the cluster, which the ForkInterface may add to
+        self.spark_conf = spark_conf
+        # Set on a STARTING cluster whose containers were started before localemr restarted, to adopt them
+        self.reattach = reattach
+        self.state_change_reason = state_change_reason
 
     def run_bootstrap_actions(self):
         self.ready_datetime = datetime.now(pytz.utc)
@@ -124,6 +141,14 @@ def filter_unwanted_conf_config(args: List[str], unwanted_configs=None):
     return args
 
 
+def with_spark_conf(cli_args: List[str], spark_conf: Dict[str, str]) -> List[str]:
+    """Passes spark_conf to a spark-submit command, ahead of its own arguments so that they take precedence."""
+    if not spark_conf or not cli_args or cli_args[0] != 'spark-submit':
+        return cli_args
+    conf_args = [arg for key, value in spark_conf.items() for arg in ('--conf', '{}={}'.format(key, value))]
+    return cli_args[:1] + conf_args + cli_args[1:]
+
+
 def clean_for_local_run(emr_step: List[str]) -> List[str]:
     return convert_s3_to_s3a_path(
         filter_unwanted_conf_config(
@@ -145,6 +170,18 @@ class LocalFakeStep(FakeStep):
         self.cluster_id = cluster_id
         self.cluster_name = cluster_name
         self.main_class = main_class
+        # Spark configuration the cluster gives its steps, under that of the step itself
+        self.spark_conf: Dict[str, str] = {}
+        # Set by the StepScheduler when the step leaves its cluster's queue for a worker
+        self.admitted_datetime = None
+        # Set on a step which was running when localemr restarted, so that it is waited on rather than run again
+        self.resumed = False
+
+    @property
+    def queue_wait_seconds(self) -> float:
+        """How long the step waited to be admitted by the StepScheduler, so far if it still is waiting."""
+        admitted_datetime = self.admitted_datetime or self.end_datetime or datetime.now(pytz.utc)
+        return (admitted_datetime - self.creation_datetime).total_seconds()
 
     def start(self):
         self.start_datetime = datetime.now(pytz.utc)
@@ -170,6 +207,32 @@ class FailureDetails:
         }
 
 
+class StepStatusUpdate:
+    """
+    The status of a step as sent by the process running it to the API, which applies it to its own
+    copy of the step. Far cheaper to pickle than the step itself, with its args and moto internals.
+    """
+    __slots__ = ('cluster_id', 'id', 'state', 'start_datetime', 'end_datetime', 'failure_details')
+
+    def __init__(self, cluster_id, step_id, state, start_datetime=None, end_datetime=None, failure_details=None):
+        self.cluster_id = cluster_id
+        self.id = step_id
+        self.state = state
+        self.start_datetime = start_datetime
+        self.end_datetime = end_datetime
+        self.failure_details = failure_details
+
+    @classmethod
+    def from_step(cls, step: LocalFakeStep) -> 'StepStatusUpdate':
+        return cls(step.cluster_id, step.id, step.state, step.start_datetime, step.end_datetime, step.failure_details)
+
+    def apply(self, step: LocalFakeStep):
+        step.state = self.state
+        step.start_datetime = self.start_datetime or step.start_datetime
+        step.end_datetime = self.end_datetime or step.end_datetime
+        step.failure_details = self.failure_details or step.failure_details
+
+
 class EmrStepState:
     PENDING = 'PENDING'
     CANCEL_PENDING = 'CANCEL_PENDING'
@@ -200,6 +263,12 @@ class ActionOnFailure:
     CONTINUE = 'CONTINUE'
 
 
+class InstanceRole:
+    MASTER = 'MASTER'
+    CORE = 'CORE'
+    TASK = 'TASK'
+
+
 class EmrClusterState:
     STARTING = 'STARTING'
     WAITING = 'WAITING'
@@ -215,6 +284,13 @@ EMR_CLUSTER_TERMINAL_STATES = [
     EmrClusterState.TERMINATED_WITH_ERRORS,
 ]
 
+# The bounds EMR places on the number of steps a cluster can run concurrently
+MIN_STEP_CONCURRENCY_LEVEL = 1
+MAX_STEP_CONCURRENCY_LEVEL = 256
+# The bounds EMR puts on the IdleTimeout of an AutoTerminationPolicy, in seconds
+MIN_IDLE_TIMEOUT = 60
+MAX_IDLE_TIMEOUT = 604800
+
 # There must be a docker image on davlum/localemr-container
 # with a matching Spark version for this to work.
 EMR_TO_APPLICATION_VERSION = {
@@ -280,5 +356,16 @@ def get_emr_version(cluster_release_label):
     return versions[-1]
 
 
+def release_label_to_spark_version(release_label: str) -> str:
+    return EMR_TO_APPLICATION_VERSION[get_emr_version(release_label)]['Spark']
+
+
+def release_labels_to_spark_versions(release_labels: List[str]) -> List[str]:
+    """The distinct Spark versions of the release labels, that of the latest release if there are none."""
+    if not release_labels:
+        return [list(EMR_TO_APPLICATION_VERSION.values())[-1]['Spark']]
+    return sorted({release_label_to_spark_version(label) for label in release_labels})
+
+
 def cluster_to_spark_version(cluster: ClusterSubset) -> dict:
-    return EMR_TO_APPLICATION_VERSION[get_emr_version(cluster.release_label)]['Spark']
+    return release_label_to_spark_version(cluster.release_label)
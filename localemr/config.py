@@ -5,6 +5,10 @@ def is_true(bool_thing) -> bool:
     return bool_thing if isinstance(bool_thing, bool) else bool_thing == 'True'
 
 
+def comma_list(value: str) -> list:
+    return [item for item in value.split(',') if item]
+
+
 class Configuration:
 
     def __init__(self):
@@ -21,6 +25,35 @@ class Configuration:
         self.localemr_aws_secret_access_key = os.environ.get('LOCALEMR_AWS_SECRET_ACCESS_KEY', 'TESTING')
         self.localemr_aws_default_region = os.environ.get('LOCALEMR_AWS_DEFAULT_REGION', 'us-east-1')
         self.localemr_container_repo = os.environ.get('LOCALEMR_CONTAINER_REPO', 'davlum/localemr-container:0.5.0-spark')
+        # The maximum number of processes running the clusters, each process can run many clusters
+        self.worker_pool_size = int(os.environ.get('LOCALEMR_WORKER_POOL_SIZE', 4))
+        # Where the logs of steps are spooled, laid out like the logs EMR writes to a cluster's LogUri
+        self.localemr_log_dir = os.environ.get('LOCALEMR_LOG_DIR', '/tmp/localemr/logs')
+        # The number of idle cluster containers to keep started per Spark version, 0 disables the warm pool
+        self.warm_pool_size = int(os.environ.get('LOCALEMR_WARM_POOL_SIZE', 0))
+        # Comma separated release labels whose Spark versions get a warm pool, defaults to the latest release
+        self.warm_pool_release_labels = comma_list(os.environ.get('LOCALEMR_WARM_POOL_RELEASE_LABELS', ''))
+        # Comma separated release labels whose images are pulled when the server starts. None by default, the
+        # image of a release label is then pulled when its first cluster starts
+        self.prepull_release_labels = comma_list(os.environ.get('LOCALEMR_PREPULL_RELEASE_LABELS', ''))
+        # The disk space the cluster images may take up before the least recently used are removed, 0 for no limit
+        self.image_disk_budget_gb = float(os.environ.get('LOCALEMR_IMAGE_DISK_BUDGET_GB', 0))
+        # Limits on the steps running at once on the host across every cluster, 0 for no limit
+        self.max_concurrent_steps = int(os.environ.get('LOCALEMR_MAX_CONCURRENT_STEPS', 0))
+        self.max_step_cores = int(os.environ.get('LOCALEMR_MAX_STEP_CORES', 0))
+        self.max_step_memory_mb = int(os.environ.get('LOCALEMR_MAX_STEP_MEMORY_MB', 0))
+        # The share of the vCPUs and memory of a cluster's instances its container is limited to, 0 for no limits
+        self.instance_scale_factor = float(os.environ.get('LOCALEMR_INSTANCE_SCALE_FACTOR', 0))
+        # Run the steps of a cluster on a Spark standalone master with a worker container per core and task instance
+        self.spark_standalone = is_true(os.environ.get('LOCALEMR_SPARK_STANDALONE', False))
+        self.max_spark_workers = int(os.environ.get('LOCALEMR_MAX_SPARK_WORKERS', 4))
+        # The seconds a cluster without an AutoTerminationPolicy may stay idle before it is terminated, 0 for ever
+        self.idle_timeout_seconds = int(os.environ.get('LOCALEMR_IDLE_TIMEOUT_SECONDS', 0))
+        # How many terminated clusters are kept per region and for how many seconds, 0 for no limit
+        self.max_terminated_clusters = int(os.environ.get('LOCALEMR_MAX_TERMINATED_CLUSTERS', 0))
+        self.terminated_cluster_retention_seconds = int(os.environ.get('LOCALEMR_TERMINATED_CLUSTER_RETENTION_SECONDS', 0))
+        # A SQLite database the clusters and steps are saved to so that they outlive a restart, empty to keep them in memory
+        self.state_db = os.environ.get('LOCALEMR_STATE_DB', '')
 
 
 configuration = Configuration()
@@ -0,0 +1,157 @@
+"""
+Rather than blocking a thread per step in a poll loop, these implementations run the steps of every cluster
+of a worker process as coroutines on a single event loop, using non-blocking HTTP. The SparkResult of each
+step is fed back through the Future returned by `submit` as soon as its batch completes.
+
+Requires aiohttp, which is an optional dependency, configure with LOCALEMR_EXEC_IMPL=livyasync or livylikeasync.
+"""
+import asyncio
+import os
+import threading
+from abc import abstractmethod
+from concurrent.futures import Future
+from typing import Dict, Optional
+import aiohttp
+import requests
+from localemr.common import LocalFakeStep, SparkResult, with_spark_conf
+from localemr.config import Configuration
+from localemr.exec.interface import ExecInterface
+from localemr.exec.livy.backend import find_livy_batch, livy_batch_result, transform_emr_step_to_livy_req, LOG_PAGE_SIZE
+from localemr.exec.livy.models import LivyBatchObject, LIVY_TERMINAL_STATES
+from localemr.exec.livylike.models import livylike_batch_result, LIVYLIKE_TERMINAL_STATES
+from localemr.exec.sessions import poll_intervals
+from localemr.step_logs import StepLogSpool
+
+# Connecting to a cluster is retried while its container starts, like the Retry of the synchronous sessions
+CONNECT_RETRIES = 8
+CONNECT_BACKOFF_FACTOR = 0.5
+
+
+def find_livy_batch_by_name(url: str, name: str) -> Optional[LivyBatchObject]:
+    with requests.Session() as session:
+        return find_livy_batch(session, url, name)
+
+
+class AsyncExec(ExecInterface):
+
+    def __init__(self, config: Configuration):
+        self.config = config
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+        # Only used from within the event loop
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+
+    def submit(self, emr_step: LocalFakeStep) -> Future:
+        return asyncio.run_coroutine_threadsafe(self.run_step(emr_step), self._get_loop())
+
+    def exec_process(self, emr_step: LocalFakeStep) -> SparkResult:
+        return self.submit(emr_step).result()
+
+    def release_cluster(self, cluster_name: str):
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+        asyncio.run_coroutine_threadsafe(self._close_session(cluster_name), self._loop)
+
+    @abstractmethod
+    async def run_step(self, emr_step: LocalFakeStep) -> SparkResult:
+        """The coroutine which submits emr_step to the cluster and waits for it to finish."""
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        # The implementation is created before the worker processes are forked, each of which starts its own loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                self._sessions = {}
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+            return self._loop
+
+    def _session(self, hostname: str) -> aiohttp.ClientSession:
+        if hostname not in self._sessions:
+            self._sessions[hostname] = aiohttp.ClientSession(raise_for_status=True)
+        return self._sessions[hostname]
+
+    async def _close_session(self, hostname: str):
+        session = self._sessions.pop(hostname, None)
+        if session is not None:
+            await session.close()
+
+    @staticmethod
+    async def wait_for_cluster(session: aiohttp.ClientSession, url: str):
+        for attempt in range(CONNECT_RETRIES + 1):
+            try:
+                async with session.get(url):
+                    return
+            except aiohttp.ClientConnectionError:
+                if attempt == CONNECT_RETRIES:
+                    raise
+                await asyncio.sleep(CONNECT_BACKOFF_FACTOR * 2 ** attempt)
+
+
+class AsyncLivy(AsyncExec):
+
+    async def run_step(self, emr_step: LocalFakeStep) -> SparkResult:
+        url = 'http://{}:8998'.format(emr_step.hostname)
+        session = self._session(emr_step.hostname)
+        await self.wait_for_cluster(session, url)
+        livy_step = transform_emr_step_to_livy_req(emr_step)
+        livy_batch = None
+        if emr_step.resumed:
+            # Only done for the steps running when localemr restarted, so the synchronous lookup is run off the loop
+            livy_batch = await asyncio.get_running_loop().run_in_executor(None, find_livy_batch_by_name, url, livy_step.name)
+        if livy_batch is None:
+            async with session.post(url + '/batches', json=livy_step.to_dict()) as resp:
+                livy_batch = LivyBatchObject.from_dict(await resp.json())
+        spool = StepLogSpool(self.config.localemr_log_dir, emr_step.cluster_id, emr_step.id)
+        intervals = poll_intervals()
+        while livy_batch.state not in LIVY_TERMINAL_STATES:
+            await asyncio.sleep(next(intervals))
+            await self._spool_batch_logs(session, url, livy_batch.id, spool)
+            async with session.get('{}/batches/{}'.format(url, livy_batch.id)) as resp:
+                livy_batch = LivyBatchObject.from_dict(await resp.json())
+        await self._spool_batch_logs(session, url, livy_batch.id, spool)
+        return livy_batch_result(livy_batch, spool)
+
+    @staticmethod
+    async def _spool_batch_logs(session: aiohttp.ClientSession, url: str, batch_id, spool: StepLogSpool):
+        while True:
+            params = {'from': spool.lines_written, 'size': LOG_PAGE_SIZE}
+            async with session.get('{}/batches/{}/log'.format(url, batch_id), params=params) as resp:
+                lines = (await resp.json())['log']
+            spool.write(lines)
+            if len(lines) < LOG_PAGE_SIZE:
+                return
+
+
+class AsyncLivyLike(AsyncExec):
+
+    async def run_step(self, emr_step: LocalFakeStep) -> SparkResult:
+        url = 'http://{}:8998'.format(emr_step.hostname)
+        session = self._session(emr_step.hostname)
+        await self.wait_for_cluster(session, url + '/health')
+        step_endpoint = '{}/batch/{}'.format(url, emr_step.id)
+        cli_args = with_spark_conf(emr_step.to_cli_args(), emr_step.spark_conf)
+        batch = await self._find_batch(session, step_endpoint) if emr_step.resumed else None
+        if batch is None:
+            async with session.post(step_endpoint, json={'args': cli_args}) as resp:
+                batch = await resp.json()
+        intervals = poll_intervals()
+        while batch['status'] not in LIVYLIKE_TERMINAL_STATES:
+            await asyncio.sleep(next(intervals))
+            async with session.get(step_endpoint) as resp:
+                batch = await resp.json()
+        spool = StepLogSpool(self.config.localemr_log_dir, emr_step.cluster_id, emr_step.id)
+        return livylike_batch_result(batch, spool)
+
+    @staticmethod
+    async def _find_batch(session: aiohttp.ClientSession, step_endpoint: str) -> Optional[dict]:
+        """The batch of the step, which LivyLike keys by step id, None if it has none."""
+        try:
+            async with session.get(step_endpoint) as resp:
+                return await resp.json()
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                return None
+            raise
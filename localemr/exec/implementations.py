@@ -10,3 +10,13 @@ def get_livylike_impl(config: Configuration):
 def get_livy_impl(config: Configuration):
     from localemr.exec.livy.backend import Livy
     return Livy(config)
+
+
+def get_livyasync_impl(config: Configuration):
+    from localemr.exec.aio.models import AsyncLivy
+    return AsyncLivy(config)
+
+
+def get_livylikeasync_impl(config: Configuration):
+    from localemr.exec.aio.models import AsyncLivyLike
+    return AsyncLivyLike(config)
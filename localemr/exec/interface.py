@@ -10,6 +10,8 @@ Here `exec` is an abstract way of thinking about
 """
 from abc import abstractmethod
 import importlib
+import threading
+from concurrent.futures import Future
 from localemr.common import SparkResult, LocalFakeStep
 from localemr.config import Configuration
 
@@ -31,6 +33,42 @@ class ExecInterface:
         Run emr_step synchronously and return SparkResult.
         """
 
+    def submit(self, emr_step: LocalFakeStep) -> Future:
+        """
+        Parameters
+        ----------
+        emr_step : The EMR step to run
+
+        Returns
+        -------
+        A Future of the SparkResult of running emr_step in the background. By default `exec_process`
+        runs in a thread of its own, implementations which can wait on many steps at once override this.
+        """
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self.exec_process(emr_step))
+            # pylint: disable=broad-except
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def release_cluster(self, cluster_name: str):
+        """
+        Parameters
+        ----------
+        cluster_name : The name of a cluster which has terminated
+
+        Returns
+        -------
+        None, frees whatever the implementation held on to for running the cluster's steps.
+        """
+
     def get_impl(self, config: Configuration):
         if self._impl is not None:
             return self._impl
@@ -1,8 +1,7 @@
-import time
 import logging
+import threading
+from typing import Dict, Optional, Set
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from localemr.common import (
     SparkResult,
     FailureDetails,
@@ -15,10 +14,19 @@ from localemr.common import (
 from localemr.config import Configuration
 from localemr.exec.interface import ExecInterface
 from localemr.exec.livy.models import *
+from localemr.exec.sessions import ClusterSessions, poll_intervals
+from localemr.step_logs import StepLogSpool
+
+# The number of log lines fetched from Livy per request
+LOG_PAGE_SIZE = 1000
+# The number of batches fetched from Livy's listing per request
+BATCH_PAGE_SIZE = 100
+# The sweeps of a Livy host's listing in a row which may fail, backing off, before its batches are failed
+MAX_SWEEP_FAILURES = 10
 
 
 def extract_spark_conf_from_args(fake_step: LocalFakeStep, cli_args: iter):
-    spark_conf = {}
+    spark_conf = dict(fake_step.spark_conf)
     livy_args = {}
     file = fake_step.jar
     for elem in cli_args:
@@ -50,6 +58,8 @@ def extract_spark_conf_from_args(fake_step: LocalFakeStep, cli_args: iter):
         file=file,
         conf=spark_conf,
         args=list(cli_args),
+        # Named after the step, so that the batch can be found again if localemr restarts while it runs
+        name=fake_step.id,
         **livy_args,
     )
 
@@ -64,58 +74,155 @@ def transform_emr_step_to_livy_req(fake_step: LocalFakeStep) -> LivyRequestBody:
     return extract_spark_conf_from_args(fake_step, cli_args)
 
 
-def post_livy_batch(hostname: str, data: LivyRequestBody) -> LivyBatchObject:
-    resp = requests.post(hostname + '/batches', json=data.to_dict())
+def post_livy_batch(session: requests.Session, hostname: str, data: LivyRequestBody) -> LivyBatchObject:
+    resp = session.post(hostname + '/batches', json=data.to_dict())
     logging.info(resp.json())
     resp.raise_for_status()
     return LivyBatchObject.from_dict(resp.json())
 
 
-def get_livy_batch(hostname: str, batch_id) -> LivyBatchObject:
-    resp = requests.get(hostname + '/batches/{}'.format(batch_id))
+def get_livy_batch(session: requests.Session, hostname: str, batch_id) -> LivyBatchObject:
+    resp = session.get(hostname + '/batches/{}'.format(batch_id))
     logging.info(resp.json())
     resp.raise_for_status()
     return LivyBatchObject.from_dict(resp.json())
 
 
-def get_batch_logs(hostname: str, batch_id) -> dict:
-    resp = requests.get(hostname + '/batches/{}/log'.format(batch_id))
-    logging.info(resp.json())
+def find_livy_batch(session: requests.Session, hostname: str, name: str) -> Optional[LivyBatchObject]:
+    """The batch with the name, None if Livy has none."""
+    start = 0
+    while True:
+        resp = session.get(hostname + '/batches', params={'from': start, 'size': BATCH_PAGE_SIZE})
+        resp.raise_for_status()
+        sessions = resp.json()['sessions']
+        for batch in sessions:
+            if batch.get('name') == name:
+                return LivyBatchObject.from_dict(batch)
+        if len(sessions) < BATCH_PAGE_SIZE:
+            return None
+        start += BATCH_PAGE_SIZE
+
+
+def get_batch_logs(session: requests.Session, hostname: str, batch_id, start: int = 0, size: int = LOG_PAGE_SIZE) -> dict:
+    resp = session.get(hostname + '/batches/{}/log'.format(batch_id), params={'from': start, 'size': size})
     resp.raise_for_status()
     return resp.json()
 
 
-def wait_for_cluster(hostname: str):
-    session = requests.Session()
-    retry = Retry(connect=8, backoff_factor=0.5)
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    session.get(hostname)
+def spool_batch_logs(session: requests.Session, hostname: str, batch_id, spool: StepLogSpool):
+    """Append the lines of the batch's log which haven't been spooled yet."""
+    while True:
+        lines = get_batch_logs(session, hostname, batch_id, start=spool.lines_written)['log']
+        spool.write(lines)
+        if len(lines) < LOG_PAGE_SIZE:
+            return
 
 
-def send_step_to_livy(emr_step: LocalFakeStep) -> SparkResult:
+class LivyBatchMonitor:
+    """
+    Refreshes the state of every outstanding batch on a Livy host with one sweep of its /batches listing
+    per interval, rather than a request per batch, and hands each batch to the step waiting on it once it
+    reaches a terminal state. The sweeping thread only runs while there are batches to wait on.
     """
 
-    Parameters
-    ----------
-    emr_step : The step to be transformed and submitted to Livy
+    def __init__(self, session: requests.Session, hostname: str, max_sweep_failures: int = MAX_SWEEP_FAILURES):
+        """
+        Parameters
+        ----------
+        session : The pooled session of the Livy host
+        hostname : The URL of the Livy host
+        max_sweep_failures : The sweeps in a row which may fail, say while Livy is unresponsive, before every
+            outstanding batch is failed with the error. Sweeps back off meanwhile.
+        """
+        self.session = session
+        self.hostname = hostname
+        self.max_sweep_failures = max_sweep_failures
+        self._condition = threading.Condition()
+        # The terminal batch, or the error of refreshing it, by id. None while the batch is outstanding
+        self._results = {}
+        self._new_batch = False
+        self._thread = None
 
-    Returns
-    -------
-    SparkResult object. For now the reason property of the FailureDetails
-    object will always contain `Unknown Error` until it is figured out what
-    other values are possible when. Reference;
-    https://docs.aws.amazon.com/emr/latest/APIReference/API_FailureDetails.html
+    def wait(self, batch_id) -> LivyBatchObject:
+        with self._condition:
+            self._results[batch_id] = None
+            self._new_batch = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+            while self._results[batch_id] is None:
+                self._condition.wait()
+            result = self._results.pop(batch_id)
+        if isinstance(result, Exception):
+            raise result
+        return result
 
-    """
-    hostname = 'http://{}:8998'.format(emr_step.hostname)
-    wait_for_cluster(hostname)
-    livy_step = transform_emr_step_to_livy_req(emr_step)
-    livy_batch = post_livy_batch(hostname, livy_step)
-    while livy_batch.state not in LIVY_TERMINAL_STATES:
-        time.sleep(5)
-        livy_batch = get_livy_batch(hostname, livy_batch.id)
+    def _run(self):
+        intervals = poll_intervals()
+        sweep_failures = 0
+        while True:
+            with self._condition:
+                if self._new_batch and not sweep_failures:
+                    # Poll quickly again, so that short batches finish fast
+                    intervals = poll_intervals()
+                    self._new_batch = False
+                self._condition.wait(next(intervals))
+                outstanding = {batch_id for batch_id, result in self._results.items() if result is None}
+                if not outstanding:
+                    self._thread = None
+                    return
+            try:
+                results = self._refresh(outstanding)
+                sweep_failures = 0
+            # pylint: disable=broad-except
+            except Exception as e:
+                sweep_failures += 1
+                if sweep_failures < self.max_sweep_failures:
+                    logging.warning("Failed to list the batches of %s, %d times in a row: %s", self.hostname, sweep_failures, e)
+                    continue
+                results = {batch_id: e for batch_id in outstanding}
+                sweep_failures = 0
+            with self._condition:
+                self._results.update({batch_id: result for batch_id, result in results.items() if batch_id in self._results})
+                self._condition.notify_all()
+
+    def _refresh(self, batch_ids: Set[int]) -> dict:
+        """
+        Returns
+        -------
+        The batches which reached a terminal state, and the error of those which couldn't be fetched, by id.
+        Raises the error of sweeping the listing, which is shared by every batch.
+        """
+        batches = self._sweep(batch_ids)
+        results = {}
+        for batch_id in batch_ids - batches.keys():
+            # Not in the listing, which Livy may have truncated, so fetch it by itself
+            try:
+                batches[batch_id] = get_livy_batch(self.session, self.hostname, batch_id)
+            # pylint: disable=broad-except
+            except Exception as e:
+                results[batch_id] = e
+        results.update({batch_id: batch for batch_id, batch in batches.items() if batch.state in LIVY_TERMINAL_STATES})
+        return results
+
+    def _sweep(self, batch_ids: Set[int]) -> Dict[int, LivyBatchObject]:
+        batches = {}
+        start = 0
+        while True:
+            resp = self.session.get(self.hostname + '/batches', params={'from': start, 'size': BATCH_PAGE_SIZE})
+            resp.raise_for_status()
+            sessions = resp.json()['sessions']
+            for batch in sessions:
+                if batch['id'] in batch_ids:
+                    batches[batch['id']] = LivyBatchObject.from_dict(batch)
+            if len(sessions) < BATCH_PAGE_SIZE or len(batches) == len(batch_ids):
+                return batches
+            start += BATCH_PAGE_SIZE
+
+
+def livy_batch_result(livy_batch: LivyBatchObject, spool: StepLogSpool) -> SparkResult:
+    """The SparkResult of a batch in a terminal state, whose log has been spooled."""
     if livy_batch.state == LivyState.SUCCESS:
         return SparkResult(
             EmrStepState.COMPLETED,
@@ -126,17 +233,61 @@ def send_step_to_livy(emr_step: LocalFakeStep) -> SparkResult:
             EmrStepState.FAILED,
             FailureDetails(
                 reason='Unknown Error',
-                log_file='\n'.join(get_batch_logs(hostname, livy_batch.id)['log']),
+                log_file=spool.failure_log_file(),
             ),
         )
 
     raise LivyError("Quit polling Livy in non-terminal state %s" % livy_batch.state)
 
 
+def send_step_to_livy(emr_step: LocalFakeStep, log_dir: str, session: requests.Session, monitor: LivyBatchMonitor) -> SparkResult:
+    """
+
+    Parameters
+    ----------
+    emr_step : The step to be transformed and submitted to Livy
+    log_dir : The directory the logs of the step are spooled to
+    session : The pooled session of the step's cluster, which retries connecting while Livy starts
+    monitor : The monitor of the batches on the step's cluster
+
+    Returns
+    -------
+    SparkResult object. For now the reason property of the FailureDetails
+    object will always contain `Unknown Error` until it is figured out what
+    other values are possible when. Reference;
+    https://docs.aws.amazon.com/emr/latest/APIReference/API_FailureDetails.html
+
+    """
+    hostname = 'http://{}:8998'.format(emr_step.hostname)
+    session.get(hostname)
+    livy_step = transform_emr_step_to_livy_req(emr_step)
+    livy_batch = find_livy_batch(session, hostname, livy_step.name) if emr_step.resumed else None
+    if livy_batch is None:
+        livy_batch = post_livy_batch(session, hostname, livy_step)
+    if livy_batch.state not in LIVY_TERMINAL_STATES:
+        livy_batch = monitor.wait(livy_batch.id)
+    spool = StepLogSpool(log_dir, emr_step.cluster_id, emr_step.id)
+    spool_batch_logs(session, hostname, livy_batch.id, spool)
+    return livy_batch_result(livy_batch, spool)
+
+
 class Livy(ExecInterface):
 
     def __init__(self, config: Configuration):
         self.config = config
+        self.sessions = ClusterSessions()
+        self._monitors: Dict[str, LivyBatchMonitor] = {}
+        self._lock = threading.Lock()
 
     def exec_process(self, emr_step: LocalFakeStep):
-        return send_step_to_livy(emr_step)
+        session = self.sessions.get(emr_step.hostname)
+        with self._lock:
+            if emr_step.hostname not in self._monitors:
+                self._monitors[emr_step.hostname] = LivyBatchMonitor(session, 'http://{}:8998'.format(emr_step.hostname))
+            monitor = self._monitors[emr_step.hostname]
+        return send_step_to_livy(emr_step, self.config.localemr_log_dir, session, monitor)
+
+    def release_cluster(self, cluster_name: str):
+        with self._lock:
+            self._monitors.pop(cluster_name, None)
+        self.sessions.close(cluster_name)
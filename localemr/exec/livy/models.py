@@ -50,8 +50,10 @@ class LivyRequestBody:
                  args: Optional[List[str]] = None,
                  conf: Optional[Dict[str, str]] = None,
                  proxy_user: Optional[str] = None,
-                 class_name: Optional[str] = None):
+                 class_name: Optional[str] = None,
+                 name: Optional[str] = None):
         self.file = file
+        self.name = name
         self.proxy_user = proxy_user
         self.class_name = class_name
         self.args = args.split(',') if isinstance(args, str) else args
@@ -64,6 +66,7 @@ class LivyRequestBody:
             'conf': self.conf,
             'proxyUser': self.proxy_user,
             'className': self.class_name,
+            'name': self.name,
         }
         return {k: v for k, v in d.items() if v is not None}
 
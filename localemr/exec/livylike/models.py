@@ -1,33 +1,63 @@
 import time
-from typing import List
-from xml.sax.saxutils import escape
+from typing import List, Optional
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from localemr.common import SparkResult, FailureDetails, EmrStepState, LocalFakeStep
+from localemr.common import SparkResult, FailureDetails, EmrStepState, LocalFakeStep, with_spark_conf
 from localemr.config import Configuration
 from localemr.exec.interface import ExecInterface
+from localemr.exec.sessions import ClusterSessions, poll_intervals
+from localemr.step_logs import StepLogSpool
 
+LIVYLIKE_TERMINAL_STATES = ('FAILED', 'SUCCEEDED')
 
-def wait_for_cluster(hostname: str):
-    session = requests.Session()
-    retry = Retry(connect=8, backoff_factor=0.5)
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    session.get(hostname + '/health')
+
+def livylike_batch_result(batch: dict, spool: StepLogSpool) -> SparkResult:
+    """The SparkResult of a batch in a terminal state, spooling its log if it failed."""
+    batch_state = batch['status']
+    if batch_state == 'SUCCEEDED':
+        return SparkResult(
+            EmrStepState.COMPLETED,
+            FailureDetails(),
+        )
+    if batch_state == 'FAILED':
+        spool.write(batch['log'].splitlines())
+        return SparkResult(
+            EmrStepState.FAILED,
+            FailureDetails(
+                reason='Unknown Error',
+                log_file=spool.failure_log_file(),
+            ),
+        )
+
+    raise ValueError("Quit polling Livy in non-terminal state %s" % batch_state)
+
+
+def find_livylike_batch(session: requests.Session, step_endpoint: str) -> Optional[dict]:
+    """The batch of the step, which LivyLike keys by step id, None if it has none."""
+    r = session.get(step_endpoint)
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r.json()
 
 
-def send_step_to_livylike(hostname: str, emr_step_id, cli_args: List[str]) -> SparkResult:
+def send_step_to_livylike(
+        hostname: str,
+        emr_step_id,
+        cli_args: List[str],
+        spool: StepLogSpool,
+        session: requests.Session,
+        resumed: bool = False) -> SparkResult:
     """
 
     Parameters
     ----------
-    config : The application Configuration object
     hostname : hostname of the cluster, ie the cluster name
     emr_step_id: The Id of the step
     cli_args : a list of arguments used to run a command line spark submit
         could support other commands in the future
+    spool : Where the log of a failed step is written
+    session : The pooled session of the cluster, which retries connecting while it starts
+    resumed : Whether the step was running when localemr restarted, its batch is then waited on if it exists
 
     Returns
     -------
@@ -38,37 +68,33 @@ def send_step_to_livylike(hostname: str, emr_step_id, cli_args: List[str]) -> Sp
 
     """
     url = 'http://{}:8998'.format(hostname)
-    wait_for_cluster(url)
+    session.get(url + '/health')
     step_endpoint = '{}/batch/{}'.format(url, emr_step_id)
-    r = requests.post(step_endpoint, json={'args': cli_args})
-    r.raise_for_status()
-    batch_state = r.json()['status']
-    while batch_state not in ('FAILED', 'SUCCEEDED'):
-        time.sleep(5)
-        r = requests.get(step_endpoint)
+    batch = find_livylike_batch(session, step_endpoint) if resumed else None
+    if batch is None:
+        r = session.post(step_endpoint, json={'args': cli_args})
         r.raise_for_status()
-        batch_state = r.json()['status']
-    if batch_state == 'SUCCEEDED':
-        return SparkResult(
-            EmrStepState.COMPLETED,
-            FailureDetails(),
-        )
-    if batch_state == 'FAILED':
-        return SparkResult(
-            EmrStepState.FAILED,
-            FailureDetails(
-                reason='Unknown Error',
-                log_file=escape(r.json()['log']),
-            ),
-        )
-
-    raise ValueError("Quit polling Livy in non-terminal state %s" % batch_state)
+        batch = r.json()
+    intervals = poll_intervals()
+    while batch['status'] not in LIVYLIKE_TERMINAL_STATES:
+        time.sleep(next(intervals))
+        r = session.get(step_endpoint)
+        r.raise_for_status()
+        batch = r.json()
+    return livylike_batch_result(batch, spool)
 
 
 class LivyLike(ExecInterface):
 
     def __init__(self, config: Configuration):
         self.config = config
+        self.sessions = ClusterSessions()
 
     def exec_process(self, emr_step: LocalFakeStep):
-        return send_step_to_livylike(emr_step.hostname, emr_step.id, emr_step.to_cli_args())
+        spool = StepLogSpool(self.config.localemr_log_dir, emr_step.cluster_id, emr_step.id)
+        session = self.sessions.get(emr_step.hostname)
+        cli_args = with_spark_conf(emr_step.to_cli_args(), emr_step.spark_conf)
+        return send_step_to_livylike(emr_step.hostname, emr_step.id, cli_args, spool, session, emr_step.resumed)
+
+    def release_cluster(self, cluster_name: str):
+        self.sessions.close(cluster_name)
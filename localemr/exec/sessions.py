@@ -0,0 +1,55 @@
+"""
+The exec backends talk HTTP to the container of each cluster. Rather than opening a connection per request,
+every cluster gets a pooled keep-alive session which is reused by all of its steps, and jobs are polled
+quickly at first so that short ones finish fast, backing off for the long ones.
+"""
+import logging
+import threading
+from typing import Dict, Iterator
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def log_latency(response: requests.Response, *_args, **_kwargs):
+    logging.debug(
+        "%s %s returned %s in %.3fs",
+        response.request.method, response.url, response.status_code, response.elapsed.total_seconds(),
+    )
+
+
+def new_session() -> requests.Session:
+    session = requests.Session()
+    # The container of a cluster may still be starting, so connecting is retried
+    adapter = HTTPAdapter(max_retries=Retry(connect=8, backoff_factor=0.5))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.hooks['response'].append(log_latency)
+    return session
+
+
+class ClusterSessions:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+
+    def get(self, hostname: str) -> requests.Session:
+        with self._lock:
+            if hostname not in self._sessions:
+                self._sessions[hostname] = new_session()
+            return self._sessions[hostname]
+
+    def close(self, hostname: str):
+        with self._lock:
+            session = self._sessions.pop(hostname, None)
+        if session is not None:
+            session.close()
+
+
+def poll_intervals(initial: float = 0.2, maximum: float = 5.0, factor: float = 1.5) -> Iterator[float]:
+    """The number of seconds to wait before each poll of a job, growing from initial to maximum."""
+    interval = initial
+    while True:
+        yield interval
+        interval = min(interval * factor, maximum)
@@ -0,0 +1,132 @@
+"""
+Every Spark version of EMR_TO_APPLICATION_VERSION has its own tag of the cluster image, which can be several GB.
+Rather than having the first RunJobFlow of a release label pull it inline, the images of the release labels of
+LOCALEMR_PREPULL_RELEASE_LABELS, if any, are pulled in parallel when the server starts. Pulls of an image are
+serialized across the worker processes, which share the ImageManager of the server.
+
+The worker processes report the images they use back to the server process, which keeps them in least
+recently used order, and removes the least recently used images which no container runs once the images
+take up more than the disk budget.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Lock, Queue
+from typing import Callable, Dict, Iterable, Optional
+import docker
+from docker.errors import APIError, ImageNotFound
+from localemr.common import EMR_TO_APPLICATION_VERSION
+
+PREPULL_THREADS = 4
+
+
+class ImageManager:
+
+    def __init__(self, container_repo: str, get_client: Callable[[], docker.DockerClient], disk_budget_bytes: int = 0):
+        """
+        Parameters
+        ----------
+        container_repo : The repository and tag prefix of the images, the Spark version is appended to it
+        get_client : Returns the Docker client of the calling process
+        disk_budget_bytes : The space the images may take up, 0 for no limit
+        """
+        self.container_repo = container_repo
+        self.get_client = get_client
+        self.disk_budget_bytes = disk_budget_bytes
+        # Created before the workers are forked, they put the images they use in it
+        self._used_images = Queue()
+        # Likewise shared with the workers, so that two of them don't pull the same image at once
+        self._pull_locks = {image: Lock() for image in self.managed_images()}
+        self._pull_locks_lock = threading.Lock()
+        # Only accessed from the thread started by start, least recently used first
+        self._last_used: Dict[str, float] = OrderedDict()
+        self.sizes: Dict[str, int] = {}
+
+    def image(self, spark_version: str) -> str:
+        return '{}{}'.format(self.container_repo, spark_version)
+
+    def managed_images(self):
+        return [self.image(versions['Spark']) for versions in EMR_TO_APPLICATION_VERSION.values()]
+
+    def size(self, image: str) -> Optional[int]:
+        """The size of the image in bytes, None if it isn't available locally."""
+        try:
+            return self.get_client().images.get(image).attrs['Size']
+        except ImageNotFound:
+            return None
+
+    def pull(self, image: str) -> int:
+        with self._pull_locks_lock:
+            # Images of the repository EMR_TO_APPLICATION_VERSION doesn't know of are only locked within the process
+            lock = self._pull_locks.setdefault(image, threading.Lock())
+        with lock:
+            size = self.size(image)
+            if size is None:
+                start = time.time()
+                size = self.get_client().images.pull(image).attrs['Size']
+                logging.info("Pulled %s, %d MB in %.1fs", image, size // 2 ** 20, time.time() - start)
+            return size
+
+    def ensure(self, spark_version: str) -> str:
+        """Pulls the image of the Spark version if it isn't available locally, and marks it as used."""
+        image = self.image(spark_version)
+        self.pull(image)
+        self._used_images.put(image)
+        return image
+
+    def start(self, prepull_spark_versions: Iterable[str]):
+        threading.Thread(target=self._run, args=(list(prepull_spark_versions),), daemon=True).start()
+
+    def evict(self):
+        if not self.disk_budget_bytes:
+            return
+        client = self.get_client()
+        for image in self.managed_images():
+            size = self.size(image)
+            if size is None:
+                self.sizes.pop(image, None)
+            else:
+                self.sizes[image] = size
+        # Images which haven't been used since the server started go first, the one just used is kept
+        candidates = [image for image in self.sizes if image not in self._last_used] + list(self._last_used)[:-1]
+        for image in candidates:
+            if sum(self.sizes.values()) <= self.disk_budget_bytes:
+                return
+            if image not in self.sizes or client.containers.list(all=True, filters={'ancestor': image}):
+                continue
+            try:
+                client.images.remove(image)
+            except APIError as e:
+                logging.warning("Could not remove image %s: %s", image, e)
+                continue
+            logging.info("Removed image %s to stay under the disk budget", image)
+            del self.sizes[image]
+            self._last_used.pop(image, None)
+
+    def _mark_used(self, image: str):
+        self._last_used.pop(image, None)
+        self._last_used[image] = time.time()
+
+    def _run(self, prepull_spark_versions):
+        with ThreadPoolExecutor(PREPULL_THREADS) as executor:
+            images = [self.image(spark_version) for spark_version in prepull_spark_versions]
+            for image, future in [(image, executor.submit(self.pull, image)) for image in images]:
+                try:
+                    self.sizes[image] = future.result()
+                # pylint: disable=broad-except
+                except Exception as e:
+                    logging.exception("Could not pull %s: %s", image, e)
+        while True:
+            try:
+                image = self._used_images.get()
+            except (EOFError, OSError):
+                # The queue is closed when the server shuts down
+                return
+            self._mark_used(image)
+            try:
+                self.evict()
+            # pylint: disable=broad-except
+            except Exception as e:
+                logging.exception(e)
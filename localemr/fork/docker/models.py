@@ -1,18 +1,60 @@
+import os
 import re
 import logging
+import threading
 from multiprocessing import Queue
+from typing import Dict, Optional
 import docker
 from docker.errors import NotFound, APIError
+from docker.models.containers import Container
 from localemr.fork.interface import ForkInterface
+from localemr.fork.docker.images import ImageManager
+from localemr.fork.docker.standalone import (
+    CLUSTER_LABEL,
+    remove_standalone_cluster,
+    scale_workers,
+    spark_master_name,
+    spark_master_url,
+    start_standalone_cluster,
+)
+from localemr.fork.docker.warm_pool import WarmPool
 from localemr.config import Configuration
-from localemr.common import ClusterSubset, cluster_to_spark_version
+from localemr.common import ClusterSubset, cluster_to_spark_version, release_labels_to_spark_versions
+from localemr.sizing import ClusterSize
+
+SPARK_VERSION_LABEL = 'localemr.spark-version'
+RELEASE_LABEL_LABEL = 'localemr.release-label'
+
+
+def cluster_labels(cluster: ClusterSubset) -> Dict[str, str]:
+    """The labels of the Livy container of a cluster, which identify it after localemr restarts."""
+    return {CLUSTER_LABEL: cluster.cluster_id, RELEASE_LABEL_LABEL: cluster.release_label}
 
 
 class Docker(ForkInterface):
 
     def __init__(self, config: Configuration, client: docker.DockerClient):
         self.config = config
-        self.client = client
+        self._client = client
+        self._client_pid = os.getpid()
+        self._network_lock = threading.Lock()
+        self._network_name: Optional[str] = None
+        self.images = ImageManager(config.localemr_container_repo, lambda: self.client, int(config.image_disk_budget_gb * 2 ** 30))
+        # Nothing is pulled ahead of the clusters unless release labels were asked for
+        self.images.start(release_labels_to_spark_versions(config.prepull_release_labels) if config.prepull_release_labels else [])
+        self.warm_pool: Optional[WarmPool] = None
+        if config.warm_pool_size > 0:
+            spark_versions = release_labels_to_spark_versions(config.warm_pool_release_labels)
+            self.warm_pool = WarmPool(config.warm_pool_size, spark_versions, lambda: self.client, self.provision_container)
+            self.warm_pool.start()
+
+    @property
+    def client(self) -> docker.DockerClient:
+        # The worker processes are forked from the process which created the client, they must not share its connections
+        if self._client_pid != os.getpid():
+            self._client = docker.DockerClient(base_url=self.config.docker_base_url)
+            self._client_pid = os.getpid()
+        return self._client
 
     def get_localemr_container(self):
         try:
@@ -22,6 +64,15 @@ class Docker(ForkInterface):
                       "changed without changing the env; LOCALEMR_CONTAINER_NAME"
             raise NotFound(message, self.config.localemr_container_name) from e
 
+    def get_network_name(self) -> str:
+        """The network of the localemr container, which the cluster containers are created in. Resolved once."""
+        with self._network_lock:
+            if self._network_name is None:
+                # TODO: Fix this dirty hack. We're just taking the first network that is attached to the container
+                localemr_networks = self.get_localemr_container().attrs['NetworkSettings']['Networks']
+                self._network_name = list(localemr_networks.keys())[0]
+            return self._network_name
+
     def run_fork_container(self, container_image, container_args):
         try:
             return self.client.containers.run(container_image, **container_args)
@@ -43,33 +94,102 @@ class Docker(ForkInterface):
                 logging.exception("Container %s not found, could not remove", cluster.name)
             else:
                 raise e
+        if self.config.spark_standalone:
+            remove_standalone_cluster(self.client, cluster.cluster_id)
         cluster.run_termination_actions()
         status_queue.put(cluster)
 
-    def create_process(self, cluster: ClusterSubset, status_queue: Queue):
-        localemr_container = self.get_localemr_container()
+    def provision_container(self, spark_version: str, name: str, labels: Dict[str, str], size: Optional[ClusterSize] = None,
+                            env: Optional[Dict[str, str]] = None) -> Container:
+        """
+        Parameters
+        ----------
+        spark_version : The Spark version the container runs
+        name : The name of the container
+        labels : Labels to set on the container on top of its Spark version
+        size : The resources the container is limited to, None for no limits
+        env : Environment variables to set on top of the AWS configuration
 
-        spark_version = cluster_to_spark_version(cluster)
-        container_image = 'localemr'
+        Returns
+        -------
+        A running container, attached to the network of the localemr container
+        """
+        container_image = self.images.ensure(spark_version)
         env = {
             'AWS_DEFAULT_REGION': self.config.localemr_aws_default_region,
             'AWS_ACCESS_KEY_ID': self.config.localemr_aws_access_key_id,
             'AWS_SECRET_ACCESS_KEY': self.config.localemr_aws_secret_access_key,
             'AWS_REGION': self.config.localemr_aws_default_region,
             'S3_ENDPOINT': self.config.s3_endpoint,
+            **(env or {}),
         }
         container_args = {
-            'name': cluster.name,
+            'name': name,
             # This binds the container's port 8998 to a random port in the host
             'ports': {'8998/tcp': None},
             'detach': True,
             'environment': env,
+            'labels': {SPARK_VERSION_LABEL: spark_version, **labels},
+            'network': self.get_network_name(),
         }
-        fork_container = self.run_fork_container(container_image, container_args)
-        # TODO: Fix this dirty hack. We're just taking the first network that is attached to the container
-        localemr_networks = localemr_container.attrs['NetworkSettings']['Networks']
-        localemr_network_name = list(localemr_networks.keys())[0]
-        localemr_network = self.client.networks.get(localemr_network_name)
-        localemr_network.connect(fork_container)
+        if size is not None:
+            container_args.update(size.docker_limits())
+        return self.run_fork_container(container_image, container_args)
+
+    def create_process(self, cluster: ClusterSubset, status_queue: Queue):
+        spark_version = cluster_to_spark_version(cluster)
+        if self.config.spark_standalone:
+            self.create_standalone_cluster(spark_version, cluster)
+        else:
+            self.create_local_cluster(spark_version, cluster)
         cluster.run_bootstrap_actions()
         status_queue.put(cluster)
+
+    def reattach_process(self, cluster: ClusterSubset) -> bool:
+        names = [cluster.name] + ([spark_master_name(cluster.name)] if self.config.spark_standalone else [])
+        for name in names:
+            try:
+                container = self.client.containers.get(name)
+            except NotFound:
+                logging.warning("Container %s of cluster %s is gone, it can't be reattached", name, cluster.cluster_id)
+                return False
+            # The containers claimed from the warm pool were labeled before they had a cluster
+            if container.status != 'running' or container.labels.get(CLUSTER_LABEL, cluster.cluster_id) != cluster.cluster_id:
+                logging.warning("Container %s isn't running cluster %s, it can't be reattached", name, cluster.cluster_id)
+                return False
+        if self.config.spark_standalone:
+            cluster.spark_conf = {**(cluster.spark_conf or {}), 'spark.master': spark_master_url(cluster.name)}
+        return True
+
+    def resize_process(self, cluster: ClusterSubset):
+        if cluster.size is not None:
+            self.client.containers.get(cluster.name).update(**cluster.size.docker_limits())
+        if self.config.spark_standalone and cluster.worker_count is not None:
+            scale_workers(
+                self.client,
+                self.images.image(cluster_to_spark_version(cluster)),
+                cluster.cluster_id,
+                cluster.name,
+                min(max(cluster.worker_count, 1), self.config.max_spark_workers),
+                cluster.size,
+            )
+
+    def create_standalone_cluster(self, spark_version: str, cluster: ClusterSubset):
+        # The containers of the warm pool can't be given the master's URL, so they aren't used
+        master_url = spark_master_url(cluster.name)
+        livy_container = self.provision_container(spark_version, cluster.name, cluster_labels(cluster), cluster.size, {'SPARK_MASTER': master_url})
+        worker_count = min(max(cluster.worker_count or 0, 1), self.config.max_spark_workers)
+        start_standalone_cluster(
+            self.client, self.images.image(spark_version), cluster.cluster_id, cluster.name, livy_container, worker_count, cluster.size,
+        )
+        cluster.spark_conf = {**(cluster.spark_conf or {}), 'spark.master': master_url}
+
+    def create_local_cluster(self, spark_version: str, cluster: ClusterSubset):
+        fork_container = None
+        if self.warm_pool is not None:
+            fork_container = self.warm_pool.claim(spark_version, cluster.name)
+            if fork_container is not None and cluster.size is not None:
+                # The containers of the pool were started without limits
+                fork_container.update(**cluster.size.docker_limits())
+        if fork_container is None:
+            self.provision_container(spark_version, cluster.name, cluster_labels(cluster), cluster.size)
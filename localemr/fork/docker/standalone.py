@@ -0,0 +1,114 @@
+"""
+By default a cluster is a single container running Livy with Spark in local mode. With LOCALEMR_SPARK_STANDALONE,
+the core and task instances of a cluster are also given containers: a Spark standalone master and a worker per
+instance, up to LOCALEMR_MAX_SPARK_WORKERS, on a network of the cluster's own which the Livy container joins.
+Steps are then submitted to the master, so that they spread over executors on several JVMs like on EMR.
+
+The master and workers run the cluster image with its entrypoint replaced, and the Livy container is given the
+master's URL as SPARK_MASTER.
+"""
+from typing import Optional
+import docker
+from docker.models.containers import Container
+from localemr.sizing import ClusterSize
+
+CLUSTER_LABEL = 'localemr.cluster-id'
+SPARK_MASTER_PORT = 7077
+MASTER_COMMAND = 'exec "$SPARK_HOME/bin/spark-class" org.apache.spark.deploy.master.Master --port {port}'
+WORKER_COMMAND = 'exec "$SPARK_HOME/bin/spark-class" org.apache.spark.deploy.worker.Worker {options}{master_url}'
+
+
+def cluster_network_name(cluster_id: str) -> str:
+    return 'localemr-{}'.format(cluster_id)
+
+
+def spark_master_name(cluster_name: str) -> str:
+    return '{}-spark-master'.format(cluster_name)
+
+
+def spark_master_url(cluster_name: str) -> str:
+    return 'spark://{}:{}'.format(spark_master_name(cluster_name), SPARK_MASTER_PORT)
+
+
+def start_standalone_cluster(
+        client: docker.DockerClient,
+        image: str,
+        cluster_id: str,
+        cluster_name: str,
+        livy_container: Container,
+        worker_count: int,
+        size: Optional[ClusterSize]):
+    """
+    Parameters
+    ----------
+    client : The Docker client of the calling process
+    image : The image of the cluster's Spark version
+    cluster_id : The id of the cluster, its containers and network are labeled with it
+    cluster_name : The name of the cluster, which its Livy container is named after
+    livy_container : The container running Livy, which joins the cluster's network
+    worker_count : The number of Spark workers to start
+    size : The resources of the cluster, split between the workers, None for no limits
+    """
+    labels = {CLUSTER_LABEL: cluster_id}
+    network = client.networks.create(cluster_network_name(cluster_id), driver='bridge', labels=labels)
+    network.connect(livy_container)
+    client.containers.run(
+        image,
+        MASTER_COMMAND.format(port=SPARK_MASTER_PORT),
+        entrypoint=['/bin/sh', '-c'],
+        name=spark_master_name(cluster_name),
+        network=network.name,
+        labels=labels,
+        detach=True,
+    )
+    scale_workers(client, image, cluster_id, cluster_name, worker_count, size)
+
+
+def scale_workers(
+        client: docker.DockerClient,
+        image: str,
+        cluster_id: str,
+        cluster_name: str,
+        worker_count: int,
+        size: Optional[ClusterSize]):
+    """
+    Starts or removes workers until the cluster has worker_count of them, the last ones started being removed
+    first. The resources of the workers which are kept are updated, though Spark only sees the cores and
+    memory a worker was started with.
+    """
+    prefix = '{}-spark-worker-'.format(cluster_name)
+    label_filter = {'label': '{}={}'.format(CLUSTER_LABEL, cluster_id)}
+    workers = sorted(
+        (container for container in client.containers.list(all=True, filters=label_filter) if container.name.startswith(prefix)),
+        key=lambda container: int(container.name[len(prefix):]),
+    )
+    for container in workers[worker_count:]:
+        container.remove(v=True, force=True)
+    worker_args = {}
+    options = ''
+    if size is not None:
+        worker_size = ClusterSize(size.cores / worker_count, size.memory_mb // worker_count)
+        worker_args = worker_size.docker_limits()
+        options = '--cores {} --memory {}m '.format(max(int(worker_size.cores), 1), worker_size.memory_mb)
+        for container in workers[:worker_count]:
+            container.update(**worker_args)
+    next_index = int(workers[-1].name[len(prefix):]) + 1 if workers else 0
+    for i in range(next_index, next_index + worker_count - len(workers)):
+        client.containers.run(
+            image,
+            WORKER_COMMAND.format(options=options, master_url=spark_master_url(cluster_name)),
+            entrypoint=['/bin/sh', '-c'],
+            name='{}{}'.format(prefix, i),
+            network=cluster_network_name(cluster_id),
+            labels={CLUSTER_LABEL: cluster_id},
+            detach=True,
+            **worker_args,
+        )
+
+
+def remove_standalone_cluster(client: docker.DockerClient, cluster_id: str):
+    label_filter = {'label': '{}={}'.format(CLUSTER_LABEL, cluster_id)}
+    for container in client.containers.list(all=True, filters=label_filter):
+        container.remove(v=True, force=True)
+    for network in client.networks.list(filters=label_filter):
+        network.remove()
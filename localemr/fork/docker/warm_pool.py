@@ -0,0 +1,117 @@
+"""
+Starting a cluster's container and waiting for Livy in it to come up takes tens of seconds. The warm pool
+keeps idle containers started ahead of time for each Spark version, so that creating a cluster only has to
+claim one and rename it after the cluster.
+
+The pool lives in Docker itself: an idle container carries the Spark version it runs as a label and has
+a name with the warm prefix, which it loses when it is claimed. A refiller thread in the process which
+started the pool keeps it topped up, the worker processes tell it when a container has been claimed.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Event, Lock
+from typing import Callable, Dict, Iterable, Optional
+import docker
+from docker.errors import APIError, NotFound
+from docker.models.containers import Container
+
+WARM_POOL_LABEL = 'localemr.warm-pool'
+WARM_NAME_PREFIX = 'localemr-warm-'
+# How often the pool is checked when no container has been claimed, to replace containers which died
+REFILL_INTERVAL = 30
+# The number of containers which are provisioned at once when refilling the pool
+PROVISION_THREADS = 4
+
+
+class WarmPool:
+
+    def __init__(
+            self,
+            size: int,
+            spark_versions: Iterable[str],
+            get_client: Callable[[], docker.DockerClient],
+            provision: Callable[[str, str, Dict[str, str]], Container]):
+        """
+        Parameters
+        ----------
+        size : The number of idle containers to keep per Spark version
+        spark_versions : The Spark versions to keep idle containers of
+        get_client : Returns the Docker client of the calling process
+        provision : Starts a container of a Spark version with the given name and labels
+        """
+        self.size = size
+        self.spark_versions = sorted(set(spark_versions))
+        self.get_client = get_client
+        self.provision = provision
+        # Created before the workers are forked, so that they are shared with them
+        self._claim_lock = Lock()
+        self._refill_needed = Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def claim(self, spark_version: str, name: str) -> Optional[Container]:
+        """
+        Returns
+        -------
+        An idle container of the Spark version renamed to name, or None if the pool has none.
+        """
+        client = self.get_client()
+        with self._claim_lock:
+            idle = self._idle_containers(client, spark_version)
+            if not idle:
+                return None
+            container = idle[0]
+            try:
+                container.rename(name)
+            except APIError as e:
+                if e.status_code != 409:
+                    raise e
+                # A container of a previous cluster with the same name is in the way
+                client.containers.get(name).remove(v=True, force=True)
+                container.rename(name)
+        self._refill_needed.set()
+        return container
+
+    def refill(self):
+        client = self.get_client()
+        with ThreadPoolExecutor(PROVISION_THREADS) as executor:
+            futures = [
+                executor.submit(
+                    self.provision,
+                    spark_version,
+                    '{}{}-{}'.format(WARM_NAME_PREFIX, spark_version, uuid.uuid4().hex[:8]),
+                    {WARM_POOL_LABEL: spark_version},
+                )
+                for spark_version in self.spark_versions
+                for _ in range(self.size - len(self._idle_containers(client, spark_version)))
+            ]
+            for future in futures:
+                future.result()
+
+    def _run(self):
+        while True:
+            try:
+                self.refill()
+            # pylint: disable=broad-except
+            except Exception as e:
+                logging.exception(e)
+            self._refill_needed.wait(REFILL_INTERVAL)
+            self._refill_needed.clear()
+
+    @staticmethod
+    def _idle_containers(client: docker.DockerClient, spark_version: str):
+        containers = client.containers.list(filters={'label': '{}={}'.format(WARM_POOL_LABEL, spark_version)})
+        idle = []
+        for container in containers:
+            try:
+                if container.name.startswith(WARM_NAME_PREFIX):
+                    idle.append(container)
+            except NotFound:
+                continue
+        return idle
@@ -49,6 +49,32 @@ class ForkInterface:
         None
         """
 
+    def resize_process(self, cluster: ClusterSubset):
+        """
+        Parameters
+        ----------
+        cluster : The cluster with its new size and worker_count
+
+        Returns
+        -------
+        None, changes the resources of the running cluster without interrupting its steps.
+        Implementations which can't resize a cluster leave it as it is.
+        """
+
+    def reattach_process(self, cluster: ClusterSubset) -> bool:
+        """
+        Parameters
+        ----------
+        cluster : A cluster which was running when localemr restarted, its spark_conf may be added to
+
+        Returns
+        -------
+        Whether the cluster is still running and has been adopted. Implementations which can't tell
+        return False, and the cluster is terminated with errors.
+        """
+        # pylint: disable=unused-argument
+        return False
+
     def get_impl(self, config: Configuration):
         if self._impl is not None:
             return self._impl
@@ -2,12 +2,15 @@
 This module combines the ForkInterface and ExecInterface which have their implementations determined in Config.
 """
 
-import time
+import functools
 import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
 import traceback
-from copy import deepcopy
 from datetime import datetime
 from multiprocessing import Queue
+from typing import Callable, List, Optional
 from xml.sax.saxutils import escape
 import pytz
 from localemr.config import Configuration
@@ -19,32 +22,68 @@ from localemr.common import (
     EmrStepState,
     EmrClusterState,
     ClusterSubset,
+    StepStatusUpdate,
 )
 
 
 class ForkExec:
+    """
+    The fork and exec implementations, created on first use so that nothing connects to Docker until a cluster
+    is started. The Supervisor starts them before forking the first worker, so that the workers share the
+    implementations of the server, warm pool included, rather than each creating its own.
+    """
 
     def __init__(self, config: Configuration):
-        self.fork = ForkInterface().get_impl(config)
-        self.exec = ExecInterface().get_impl(config)
+        self.config = config
+        self._lock = threading.Lock()
+        self._fork: Optional[ForkInterface] = None
+        self._exec: Optional[ExecInterface] = None
 
+    def start(self):
+        with self._lock:
+            if self._fork is None:
+                self._fork = ForkInterface().get_impl(self.config)
+            if self._exec is None:
+                self._exec = ExecInterface().get_impl(self.config)
 
-def make_step_terminal(step: LocalFakeStep, failure_details: FailureDetails, state: EmrStepState) -> LocalFakeStep:
-    step = deepcopy(step)
-    step.failure_details = failure_details
-    step.state = state
-    step.end_datetime = datetime.now(pytz.utc)
-    return step
+    @property
+    def fork(self) -> ForkInterface:
+        if self._fork is None:
+            self.start()
+        return self._fork
 
+    @property
+    def exec(self) -> ExecInterface:
+        if self._exec is None:
+            self.start()
+        return self._exec
 
-def process_step(exec_impl: ExecInterface, step: LocalFakeStep, status_queue):
+
+def make_step_terminal(step: LocalFakeStep, failure_details: FailureDetails, state: EmrStepState) -> StepStatusUpdate:
+    return StepStatusUpdate(
+        step.cluster_id,
+        step.id,
+        state,
+        start_datetime=step.start_datetime,
+        end_datetime=datetime.now(pytz.utc),
+        failure_details=failure_details,
+    )
+
+
+def start_step(step: LocalFakeStep, status_queue):
     step.state = EmrStepState.RUNNING
-    step.start()
+    if not step.resumed:
+        step.start()
+    status_queue.put(StepStatusUpdate.from_step(step))
+
+
+def finish_step(step: LocalFakeStep, future: Future, status_queue):
+    """Publish the terminal status of a step from the future of its SparkResult."""
+    if future.cancelled():
+        return
     try:
-        status_queue.put(step)
-        spark_result = exec_impl.exec_process(step)
-        step = make_step_terminal(step, spark_result.failure_details, spark_result.state)
-        status_queue.put(step)
+        spark_result = future.result()
+        status_queue.put(make_step_terminal(step, spark_result.failure_details, spark_result.state))
 
     # pylint: disable=broad-except
     except Exception as e:
@@ -52,35 +91,220 @@ def process_step(exec_impl: ExecInterface, step: LocalFakeStep, status_queue):
             reason='Unknown Reason',
             message=escape(traceback.format_exc()),
         )
-        step = make_step_terminal(step, failure_details, EmrStepState.FAILED)
         logging.exception(e)
-        status_queue.put(step)
+        status_queue.put(make_step_terminal(step, failure_details, EmrStepState.FAILED))
+
+
+class ClusterInbox:
+    """
+    The inputs of a cluster's thread. Cluster actions take priority over steps, and `get` blocks
+    until either can be taken, so both are picked up as soon as they are put.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._cluster_subsets = deque()
+        self._steps = deque()
+
+    def put_cluster_subset(self, cluster_subset: ClusterSubset):
+        with self._condition:
+            self._cluster_subsets.append(cluster_subset)
+            self._condition.notify()
+
+    def put_step(self, step: LocalFakeStep):
+        with self._condition:
+            self._steps.append(step)
+            self._condition.notify()
+
+    def notify(self):
+        """Wake the reader so that it reevaluates whether it can take a step."""
+        with self._condition:
+            self._condition.notify()
+
+    def is_empty(self) -> bool:
+        return not self._cluster_subsets and not self._steps
+
+    def take_steps(self) -> List[LocalFakeStep]:
+        """Remove and return every step which is still waiting to run."""
+        with self._condition:
+            steps = list(self._steps)
+            self._steps.clear()
+            return steps
+
+    def get(self, can_take_step: Callable[[], bool]):
+        """
+        Parameters
+        ----------
+        can_take_step : Whether the reader has the capacity to run another step
+
+        Returns
+        -------
+        The next ClusterSubset, else the next step if one can be taken. Blocks until either is available
+        or `notify` is called, in which case None is returned.
+        """
+        with self._condition:
+            item = self._take(can_take_step)
+            if item is None:
+                self._condition.wait()
+                item = self._take(can_take_step)
+            return item
+
+    def _take(self, can_take_step: Callable[[], bool]):
+        if self._cluster_subsets:
+            return self._cluster_subsets.popleft()
+        if self._steps and can_take_step():
+            return self._steps.popleft()
+        return None
+
+
+class ClusterStatePublisher:
+    """
+    Publishes the state of a cluster only when it changes. An idle cluster's thread would otherwise
+    report WAITING every time it wakes up, and a busy one RUNNING for every step it takes.
+    """
+
+    def __init__(self, cluster_status_queue: Queue):
+        self.cluster_status_queue = cluster_status_queue
+        self.state = None
+
+    def put(self, cluster_subset: ClusterSubset):
+        """Has the signature of Queue.put so that it can be given to the ForkInterface in place of the queue."""
+        carries_more_than_state = any(
+            value is not None for attribute, value in vars(cluster_subset).items() if attribute not in ('cluster_id', 'state')
+        )
+        if cluster_subset.state != self.state or carries_more_than_state:
+            self.state = cluster_subset.state or self.state
+            self.cluster_status_queue.put(cluster_subset)
+
+
+class StepExecutor:
+    """
+    Runs up to `concurrency` steps of a cluster at once through ExecInterface.submit, so that steps
+    report their status independently of one another. Mirrors EMR's StepConcurrencyLevel.
+    """
+
+    def __init__(self, exec_impl: ExecInterface, step_status_queue: Queue, concurrency: int = 1,
+                 on_step_done: Optional[Callable[[], None]] = None):
+        self.exec_impl = exec_impl
+        self.step_status_queue = step_status_queue
+        self.concurrency = concurrency
+        self.on_step_done = on_step_done
+        self._running_steps = {}
+        self._futures = {}
+        self._interrupted = False
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> int:
+        return len(self._running_steps)
+
+    def has_capacity(self) -> bool:
+        return self.running < self.concurrency
+
+    def set_concurrency(self, concurrency: int):
+        # Lowering the concurrency doesn't interrupt running steps, new steps wait for them to finish
+        self.concurrency = concurrency
+
+    def submit(self, step: LocalFakeStep):
+        with self._lock:
+            self._running_steps[step.id] = step
+        start_step(step, self)
+        future = self.exec_impl.submit(step)
+        with self._lock:
+            self._futures[step.id] = future
+        future.add_done_callback(functools.partial(self._finish, step))
+
+    def interrupt(self) -> List[LocalFakeStep]:
+        """
+        Returns
+        -------
+        The steps which are still running. They are cancelled where the ExecInterface supports it,
+        either way from here on nothing they report is published, so the caller decides their final state.
+        """
+        with self._lock:
+            self._interrupted = True
+            futures = list(self._futures.values())
+            steps = list(self._running_steps.values())
+        for future in futures:
+            future.cancel()
+        return steps
+
+    def put(self, step_status_update: StepStatusUpdate):
+        """The status queue given to start_step and finish_step, which drops the statuses of interrupted steps."""
+        with self._lock:
+            if not self._interrupted:
+                self.step_status_queue.put(step_status_update)
+
+    def _finish(self, step: LocalFakeStep, future: Future):
+        try:
+            finish_step(step, future, self)
+        finally:
+            with self._lock:
+                self._running_steps.pop(step.id, None)
+                self._futures.pop(step.id, None)
+            if self.on_step_done is not None:
+                self.on_step_done()
+
+
+def start_cluster(fork_exec: ForkExec, cluster_subset: ClusterSubset, publisher: ClusterStatePublisher) -> bool:
+    """Creates the cluster, or adopts its containers if it was running when localemr restarted. False if they are gone."""
+    if not cluster_subset.reattach:
+        fork_exec.fork.create_process(cluster_subset, publisher)
+        return True
+    if fork_exec.fork.reattach_process(cluster_subset):
+        return True
+    publisher.put(ClusterSubset(
+        cluster_id=cluster_subset.cluster_id,
+        state=EmrClusterState.TERMINATED_WITH_ERRORS,
+        end_datetime=datetime.now(pytz.utc),
+        state_change_reason='The cluster was gone when localemr restarted',
+    ))
+    return False
 
 
 def run_fork_exec(
         fork_exec: ForkExec,
-        step_process_queue: Queue,
+        cluster_id: str,
+        inbox: ClusterInbox,
         step_status_queue: Queue,
-        cluster_process_queue: Queue,
         cluster_status_queue: Queue):
+    executor = StepExecutor(fork_exec.exec, step_status_queue, on_step_done=inbox.notify)
+    publisher = ClusterStatePublisher(cluster_status_queue)
+    spark_conf = {}
     while True:
-        if cluster_process_queue.empty():
-            if step_process_queue.empty():
-                cluster_status_queue.put(ClusterSubset(state=EmrClusterState.WAITING))
-                time.sleep(4)
-            else:
-                cluster_status_queue.put(ClusterSubset(state=EmrClusterState.RUNNING))
-                step = step_process_queue.get()
-                process_step(fork_exec.exec, step, step_status_queue)
-        else:
-            cluster_subset = cluster_process_queue.get()
-            if cluster_subset.state == EmrClusterState.STARTING:
-                fork_exec.fork.create_process(cluster_subset, cluster_status_queue)
-            elif cluster_subset.state == EmrClusterState.TERMINATING:
-                fork_exec.fork.terminate_process(cluster_subset, cluster_status_queue)
+        if executor.running == 0 and inbox.is_empty():
+            publisher.put(ClusterSubset(cluster_id=cluster_id, state=EmrClusterState.WAITING))
+        item = inbox.get(executor.has_capacity)
+        if item is None:
+            continue
+        if isinstance(item, LocalFakeStep):
+            publisher.put(ClusterSubset(cluster_id=cluster_id, state=EmrClusterState.RUNNING))
+            item.spark_conf = spark_conf
+            executor.submit(item)
+            continue
+        cluster_subset = item
+        if cluster_subset.step_concurrency_level:
+            executor.set_concurrency(cluster_subset.step_concurrency_level)
+        if cluster_subset.state is None and cluster_subset.worker_count is not None:
+            # Steps which are already running keep the resources they were started with
+            fork_exec.fork.resize_process(cluster_subset)
+            spark_conf = {**spark_conf, **(cluster_subset.spark_conf or {})}
+        if cluster_subset.state == EmrClusterState.STARTING:
+            if not start_cluster(fork_exec, cluster_subset, publisher):
                 return
-            else:
-                raise ValueError(
-                    "Should only be processing cluster actions on States; "
-                    "STARTING and TERMINATING. State is; {}".format(cluster_subset.state),
-                )
+            spark_conf = cluster_subset.spark_conf or {}
+        elif cluster_subset.state == EmrClusterState.TERMINATING:
+            # Like on EMR, steps which haven't started are cancelled and running ones are interrupted
+            failure_details = FailureDetails(reason='Cluster terminated', message='The cluster terminated before the step finished')
+            for step in inbox.take_steps():
+                step_status_queue.put(make_step_terminal(step, failure_details, EmrStepState.CANCELLED))
+            for step in executor.interrupt():
+                step_status_queue.put(make_step_terminal(step, failure_details, EmrStepState.INTERRUPTED))
+            fork_exec.fork.terminate_process(cluster_subset, publisher)
+            fork_exec.exec.release_cluster(cluster_subset.name)
+            return
+        elif cluster_subset.state is not None:
+            raise ValueError(
+                "Should only be processing cluster actions on States; "
+                "STARTING and TERMINATING. State is; {}".format(cluster_subset.state),
+            )
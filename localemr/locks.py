@@ -0,0 +1,75 @@
+"""
+The backend of a region is shared by every request thread of the server, as well as by the reaper. Requests
+take the backend's RWLock for reading, so that they run in parallel, and the lock of each cluster they
+touch, so that requests on different clusters don't wait on each other. Only what drops clusters from the
+registry, the reaper evicting terminated clusters and reset, takes the RWLock for writing.
+
+Locks are always taken in the same order to rule out deadlocks: the RWLock, then the locks of clusters by
+id, then the locks internal to the supervisor, collector and state store, which don't call back out.
+"""
+import threading
+from contextlib import contextmanager, ExitStack
+from typing import Dict, Iterable, Iterator
+
+
+class RWLock:
+    """
+    Any number of readers or a single writer. A waiting writer holds off new readers so that it isn't starved,
+    except for the threads which already hold the lock, which may take it again. A writer may also take it
+    for reading, but a reader can't upgrade to writing, it would wait on itself.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers: Dict[int, int] = {}
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        thread = threading.get_ident()
+        with self._condition:
+            if self._writer != thread and thread not in self._readers:
+                while self._writer is not None or self._writers_waiting:
+                    self._condition.wait()
+            self._readers[thread] = self._readers.get(thread, 0) + 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers[thread] -= 1
+                if not self._readers[thread]:
+                    del self._readers[thread]
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        thread = threading.get_ident()
+        with self._condition:
+            if self._writer != thread:
+                if thread in self._readers:
+                    raise RuntimeError("A thread holding the lock for reading can't take it for writing")
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+                self._writers_waiting -= 1
+                self._writer = thread
+            self._writer_depth += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._condition.notify_all()
+
+
+@contextmanager
+def cluster_locks(clusters: Iterable) -> Iterator[None]:
+    """Holds the locks of the clusters, taken in the order of their ids."""
+    with ExitStack() as stack:
+        for cluster in sorted(clusters, key=lambda cluster: cluster.id):
+            stack.enter_context(cluster.lock)
+        yield
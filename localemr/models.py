@@ -1,42 +1,112 @@
 from __future__ import unicode_literals
-from datetime import datetime
+import atexit
+from datetime import datetime, timedelta
 
 import functools
-from typing import List
-from multiprocessing import Queue, Process
+import threading
+from typing import FrozenSet, List, Optional
 
 import pytz
 from boto3 import Session
+from dateutil.parser import parse as dtparse
 from moto.emr.models import (
-    FakeStep,
     FakeCluster,
     ElasticMapReduceBackend,
 )
+from moto.emr.exceptions import EmrError
 from localemr.config import configuration
-from localemr.fork_exec import ForkExec, run_fork_exec
+from localemr.collector import StatusCollector
+from localemr.persistence import ClusterRegistry, StateStore
+from localemr.steps import ArchivedStep, StepStore
+from localemr.fork_exec import ForkExec, make_step_terminal
+from localemr.locks import RWLock, cluster_locks
+from localemr.reaper import ClusterReaper
+from localemr.scheduler import StepScheduler
+from localemr.sizing import ClusterSize
+from localemr.supervisor import Supervisor
 from localemr.common import (
     LocalFakeStep,
+    FailureDetails,
     EmrClusterState,
     EmrStepState,
+    InstanceRole,
     EMR_CLUSTER_TERMINAL_STATES,
     EMR_TO_APPLICATION_VERSION,
+    MIN_STEP_CONCURRENCY_LEVEL,
+    MAX_STEP_CONCURRENCY_LEVEL,
+    MIN_IDLE_TIMEOUT,
+    MAX_IDLE_TIMEOUT,
     ClusterSubset,
+    StepStatusUpdate,
 )
 
+# The states of the clusters which were running when localemr stopped, and are reattached when it starts
+ACTIVE_CLUSTER_STATES = [EmrClusterState.STARTING, EmrClusterState.BOOTSTRAPPING, EmrClusterState.RUNNING,
+                         EmrClusterState.WAITING, EmrClusterState.TERMINATING]
+# The states of the steps which keep a cluster from being idle, and are saved whole rather than archived
+ACTIVE_STEP_STATES = [EmrStepState.PENDING, EmrStepState.RUNNING, EmrStepState.CANCEL_PENDING]
+
+
+def validate_step_concurrency_level(step_concurrency_level) -> int:
+    step_concurrency_level = int(step_concurrency_level)
+    if not MIN_STEP_CONCURRENCY_LEVEL <= step_concurrency_level <= MAX_STEP_CONCURRENCY_LEVEL:
+        raise EmrError(
+            error_type="ValidationException",
+            message="StepConcurrencyLevel must be between {} and {}, got {}".format(
+                MIN_STEP_CONCURRENCY_LEVEL, MAX_STEP_CONCURRENCY_LEVEL, step_concurrency_level,
+            ),
+            template="error_json",
+        )
+    return step_concurrency_level
 
-class LocalFakeCluster(FakeCluster):
 
-    def __init__(self, **kwargs):
-        self.step_process_queue = Queue()
-        self.step_status_queue = Queue()
+def validate_idle_timeout(idle_timeout) -> int:
+    idle_timeout = int(idle_timeout)
+    if not MIN_IDLE_TIMEOUT <= idle_timeout <= MAX_IDLE_TIMEOUT:
+        raise EmrError(
+            error_type="ValidationException",
+            message="IdleTimeout must be between {} and {} seconds, got {}".format(MIN_IDLE_TIMEOUT, MAX_IDLE_TIMEOUT, idle_timeout),
+            template="error_json",
+        )
+    return idle_timeout
+
 
-        self.cluster_process_queue = Queue()
-        self.cluster_status_queue = Queue()
+class LocalFakeCluster(FakeCluster):
 
+    def __init__(self, step_concurrency_level=1, idle_timeout=None, **kwargs):
+        self.step_concurrency_level = validate_step_concurrency_level(step_concurrency_level)
+        # The IdleTimeout of the cluster's AutoTerminationPolicy, None for the server's default
+        self.idle_timeout = validate_idle_timeout(idle_timeout) if idle_timeout is not None else None
+        self.last_activity_datetime = None
+        self.last_state_change_reason = None
+        # Held by the threads reading or changing the cluster and its steps, see localemr.locks
+        self.lock = threading.RLock()
         super().__init__(**kwargs)
         # Use latest release if none is specified
         self.release_label = self.release_label or 'emr-' + list(EMR_TO_APPLICATION_VERSION.keys())[-1]
 
+    @classmethod
+    def from_record(cls, emr_backend, attributes: dict, steps: List[ArchivedStep]) -> 'LocalFakeCluster':
+        cluster = cls.__new__(cls)
+        cluster.__dict__.update(attributes)
+        cluster.emr_backend = emr_backend
+        cluster.lock = threading.RLock()
+        cluster.steps = StepStore(steps)
+        return cluster
+
+    def record(self) -> tuple:
+        """What is saved to the StateStore, the cluster's attributes and its instance groups which the backend holds."""
+        attributes = {attribute: value for attribute, value in vars(self).items() if attribute not in ('emr_backend', '_steps', 'lock')}
+        return attributes, self.instance_groups
+
+    @property
+    def steps(self) -> StepStore:
+        return self._steps
+
+    @steps.setter
+    def steps(self, steps):
+        self._steps = steps if isinstance(steps, StepStore) else StepStore(steps)
+
     def run_bootstrap_actions(self):
         self.ready_datetime = datetime.now(pytz.utc)
 
@@ -45,11 +115,32 @@ class LocalFakeCluster(FakeCluster):
             if not self.keep_job_flow_alive_when_no_steps:
                 self.terminate()
 
-    def terminate(self):
+    def terminate(self, reason: Optional[str] = None):
         self.state = EmrClusterState.TERMINATING
-        self.cluster_process_queue.put(self.create_cluster_subset())
+        self.last_state_change_reason = reason
+        self.emr_backend.supervisor.submit(self.id, self.create_cluster_subset())
+        self.emr_backend.save_cluster(self)
+
+    def record_activity(self, activity_datetime: Optional[datetime]):
+        if activity_datetime is not None and (self.last_activity_datetime is None or activity_datetime > self.last_activity_datetime):
+            self.last_activity_datetime = activity_datetime
+
+    def idle_seconds(self, now: datetime) -> Optional[float]:
+        """How long the cluster has been WAITING with no step to run, None if it isn't."""
+        if self.state != EmrClusterState.WAITING or self.last_activity_datetime is None:
+            return None
+        if self._steps.select(step_states=ACTIVE_STEP_STATES):
+            return None
+        return (now - self.last_activity_datetime).total_seconds()
 
     def add_steps(self, steps):
+        # moto adds the initial steps before the state of the cluster is set
+        if getattr(self, 'state', None) in EMR_CLUSTER_TERMINAL_STATES + [EmrClusterState.TERMINATING]:
+            raise EmrError(
+                error_type="ValidationException",
+                message="A job flow that is shutting down, terminated, or finished may not be modified.",
+                template="error_json",
+            )
         added_steps = []
         for step in steps:
             fake = LocalFakeStep(
@@ -60,94 +151,470 @@ class LocalFakeCluster(FakeCluster):
                 main_class=step.pop('hadoop_jar_step._main_class', None),
                 **step,
             )
-            self.step_process_queue.put(fake)
+            self.emr_backend.supervisor.submit(self.id, fake)
             self.steps.append(fake)
+            self.record_activity(fake.creation_datetime)
             added_steps.append(fake)
         return added_steps
 
+    def set_step_concurrency_level(self, step_concurrency_level: int):
+        self.step_concurrency_level = validate_step_concurrency_level(step_concurrency_level)
+        self.emr_backend.supervisor.submit(
+            self.id,
+            ClusterSubset(cluster_id=self.id, state=None, step_concurrency_level=self.step_concurrency_level),
+        )
+
     def update_with_cluster_subset(self, cluster_subset: ClusterSubset):
         self.state = cluster_subset.state or self.state
         self.start_datetime = cluster_subset.start_datetime or self.start_datetime
         self.ready_datetime = cluster_subset.ready_datetime or self.ready_datetime
         self.end_datetime = cluster_subset.end_datetime or self.end_datetime
+        self.last_state_change_reason = cluster_subset.state_change_reason or self.last_state_change_reason
+        self.record_activity(cluster_subset.ready_datetime)
+
+    def size(self) -> Optional[ClusterSize]:
+        """The resources of the cluster's container, None if they aren't limited."""
+        if not configuration.instance_scale_factor or not self.instance_group_ids:
+            return None
+        return ClusterSize.from_instances(
+            [(group.type, group.num_instances) for group in self.instance_groups],
+            configuration.instance_scale_factor,
+        )
 
     def create_cluster_subset(self) -> ClusterSubset:
+        size = self.size()
         return ClusterSubset(
+            cluster_id=self.id,
             name=self.name,
             release_label=self.release_label,
             state=self.state,
             start_datetime=self.start_datetime,
             ready_datetime=self.ready_datetime,
             end_datetime=self.end_datetime,
+            step_concurrency_level=self.step_concurrency_level,
+            size=size,
+            worker_count=self.worker_count(),
+            spark_conf=size.spark_conf() if size is not None else None,
         )
 
+    def worker_count(self) -> int:
+        return sum(group.num_instances for group in self.instance_groups if group.role in (InstanceRole.CORE, InstanceRole.TASK))
+
+    def resize(self):
+        """Hand the size of the cluster's instance groups to the running cluster."""
+        size = self.size()
+        self.emr_backend.supervisor.submit(self.id, ClusterSubset(
+            cluster_id=self.id,
+            state=None,
+            name=self.name,
+            release_label=self.release_label,
+            size=size,
+            worker_count=self.worker_count(),
+            spark_conf=size.spark_conf() if size is not None else None,
+        ))
+
 
 def update_wrapper(func):
+    """Apply the pending status updates of every cluster which received some, under the registry's read lock."""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self.registry_lock.read():
+            self.reattach_clusters()
+            self.apply_status_updates()
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+def persist_wrapper(func):
+    """Save the clusters the method is called with, by id or by list of ids, once it returns."""
+    @functools.wraps(func)
+    def wrapper(self, cluster_ids, *args, **kwargs):
+        result = func(self, cluster_ids, *args, **kwargs)
+        for cluster_id in [cluster_ids] if isinstance(cluster_ids, str) else cluster_ids:
+            self.save_cluster(self.clusters[cluster_id])
+        return result
+    return wrapper
+
+
+def lock_wrapper(func):
+    """Hold the locks of the clusters the method is called with, by list of ids, while it runs."""
+    @functools.wraps(func)
+    def wrapper(self, cluster_ids, *args, **kwargs):
+        with cluster_locks([self.clusters[cluster_id] for cluster_id in cluster_ids]):
+            return func(self, cluster_ids, *args, **kwargs)
+    return wrapper
+
+
+def registry_write_wrapper(func):
+    """Hold the registry's write lock while the method adds or drops clusters."""
     @functools.wraps(func)
     def wrapper(self, *args, **kwargs):
-        for cluster_id in self.clusters.keys():
-            self.update_steps_and_cluster(cluster_id)
-        return func(self, *args, **kwargs)
+        with self.registry_lock.write():
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+def cluster_update_wrapper(func):
+    """
+    Apply the pending status updates of only the cluster the method is called with, under the registry's read
+    lock and the cluster's lock, so that requests on other clusters carry on in parallel.
+    """
+    @functools.wraps(func)
+    def wrapper(self, cluster_id, *args, **kwargs):
+        with self.registry_lock.read():
+            # Before taking the cluster's lock, reattaching takes the locks of other clusters
+            self.reattach_clusters()
+            cluster = self.clusters.get(cluster_id)
+            # Left to the method to raise what it does for a cluster which doesn't exist
+            with cluster_locks([cluster] if cluster is not None else []):
+                self.apply_status_updates([cluster_id])
+                return func(self, cluster_id, *args, **kwargs)
     return wrapper
 
 
+# The workers and their status queues are shared by the backends of every region,
+# so that LOCALEMR_WORKER_POOL_SIZE bounds the number of worker processes of the whole server
+status_collector = StatusCollector()
+supervisor = Supervisor(
+    ForkExec(configuration),
+    configuration.worker_pool_size,
+    status_collector,
+    StepScheduler(configuration.max_concurrent_steps, configuration.max_step_cores, configuration.max_step_memory_mb),
+)
+if configuration.warm_pool_size > 0 or configuration.prepull_release_labels:
+    # The warm pool and the image pulls which were asked for start with the server rather than with the first cluster
+    supervisor.fork_exec.start()
+status_collector.on_cluster_status = supervisor.release_if_terminal
+status_collector.on_step_status = supervisor.release_step_if_terminal
+cluster_reaper = ClusterReaper(lambda: emr_backends.values())
+state_store = StateStore(configuration.state_db) if configuration.state_db else None
+if state_store is not None:
+    atexit.register(state_store.close)
+
+
 class LocalElasticMapReduceBackend(ElasticMapReduceBackend):
 
     def __init__(self, region_name):
         super(LocalElasticMapReduceBackend, self).__init__(region_name)
-        self.fork_exec = ForkExec(configuration)
-
-    def update_steps_and_cluster(self, cluster_id):
-        steps: List[FakeStep] = self.clusters[cluster_id].steps
-        cluster_status_queue: Queue = self.clusters[cluster_id].cluster_status_queue
-        step_status_queue: Queue = self.clusters[cluster_id].step_status_queue
-        while not step_status_queue.empty():
-            updated_step = step_status_queue.get()
-            steps = [updated_step if step.id == updated_step.id else step for step in steps]
-        while not cluster_status_queue.empty():
-            updated_cluster: ClusterSubset = cluster_status_queue.get()
-            self.clusters[cluster_id].update_with_cluster_subset(updated_cluster)
+        self.status_collector = status_collector
+        self.supervisor = supervisor
+        self.store = state_store
+        self.clusters = ClusterRegistry(self.load_cluster)
+        self.registry_lock = RWLock()
+        # The backends are created while this module is imported, and a worker forked then deadlocks on the import lock.
+        # So the clusters which were running when localemr stopped are loaded here, but reattached on the first request
+        # or reaper sweep.
+        self._reattach_lock = threading.Lock()
+        self._unattached_cluster_ids = []
+        if self.store is not None:
+            self._unattached_cluster_ids = [
+                cluster_id for cluster_id in self.store.cluster_ids(self.region_name, ACTIVE_CLUSTER_STATES) if self.load_cluster(cluster_id)
+            ]
+        if self._unattached_cluster_ids:
+            cluster_reaper.start()
+
+    def reset(self):
+        for cluster in self.clusters.values():
+            if cluster.state not in EMR_CLUSTER_TERMINAL_STATES + [EmrClusterState.TERMINATING]:
+                cluster.terminate()
+        if self.store is not None:
+            self.store.delete_region(self.region_name)
+        super().reset()
+
+    def save_cluster(self, cluster: LocalFakeCluster, steps=()):
+        """Queues the cluster and the given steps of it to be saved to the StateStore, if there is one."""
+        if self.store is None:
+            return
+        self.store.put_cluster(self.region_name, cluster.id, cluster.state, cluster.creation_datetime, cluster.end_datetime, cluster.record())
+        for step in steps:
+            # Unfinished steps are saved whole, so that they can be run or waited on again after a restart
+            record = step if step.state in ACTIVE_STEP_STATES else ArchivedStep(step)
+            self.store.put_step(cluster.id, step.id, cluster.steps.position(step.id), step.state, record)
+
+    def load_cluster(self, cluster_id: str) -> Optional[LocalFakeCluster]:
+        """Loads a cluster from the StateStore into the registry, returns None if it isn't there either."""
+        record = self.store.get_cluster(self.region_name, cluster_id) if self.store is not None else None
+        if record is None:
+            return None
+        attributes, instance_groups = record
+        cluster = LocalFakeCluster.from_record(self, attributes, self.store.get_steps(cluster_id))
+        # Its instance groups first, other threads may describe the cluster as soon as it is in the registry
+        for instance_group in instance_groups:
+            self.instance_groups[instance_group.id] = instance_group
+        self.clusters[cluster_id] = cluster
+        return cluster
+
+    def reattach_clusters(self):
+        """Reattaches the clusters loaded at startup, must be called without holding the lock of any cluster."""
+        if not self._unattached_cluster_ids:
+            return
+        with self._reattach_lock:
+            cluster_ids, self._unattached_cluster_ids = self._unattached_cluster_ids, []
+            for cluster_id in cluster_ids:
+                cluster = self.clusters[cluster_id]
+                with cluster.lock:
+                    self.reattach_cluster(cluster)
+
+    def reattach_cluster(self, cluster: LocalFakeCluster):
+        """
+        Hands a cluster which was running when localemr stopped to a worker, which adopts its containers
+        or terminates it with errors if they are gone. Its pending steps are submitted again, and those
+        which were running are waited on rather than run a second time.
+        """
+        self.status_collector.start()
+        if cluster.state == EmrClusterState.TERMINATING:
+            cluster.terminate(cluster.last_state_change_reason)
+            return
+        cluster_subset = cluster.create_cluster_subset()
+        cluster_subset.state = EmrClusterState.STARTING
+        cluster_subset.reattach = True
+        self.supervisor.submit(cluster.id, cluster_subset)
+        for step in cluster.steps.select(step_states=[EmrStepState.PENDING, EmrStepState.RUNNING]):
+            if isinstance(step, LocalFakeStep):
+                step.resumed = step.state == EmrStepState.RUNNING
+                self.supervisor.submit(cluster.id, step)
+
+    def apply_status_updates(self, cluster_ids=None):
+        """
+        The collector is shared between regions, so only the updates of this backend's clusters are taken.
+        Only the clusters in memory can have updates, so the StateStore isn't looked up for the others.
+        """
+        cluster_ids = self.clusters.keys() if cluster_ids is None else cluster_ids
+        for cluster_id, step_updates, cluster_update in self.status_collector.drain(cluster_ids):
+            cluster = self.clusters.loaded(cluster_id)
+            if cluster is not None:
+                with cluster.lock:
+                    self.update_steps_and_cluster(cluster_id, step_updates, cluster_update)
+
+    def update_steps_and_cluster(self, cluster_id, step_updates: List[StepStatusUpdate], cluster_update: Optional[ClusterSubset]):
+        steps: StepStore = self.clusters[cluster_id].steps
+        updated_steps = []
+        for step_update in step_updates:
+            step = steps.get(step_update.id)
+            if step is not None:
+                step_update.apply(step)
+                steps.update(step)
+                self.clusters[cluster_id].record_activity(step.end_datetime)
+                updated_steps.append(step)
+        if cluster_update is not None:
+            self.clusters[cluster_id].update_with_cluster_subset(cluster_update)
+            if cluster_update.state in EMR_CLUSTER_TERMINAL_STATES:
+                # Steps left unfinished on a terminated cluster, say because its worker was lost, never will finish
+                failure_details = FailureDetails(reason='Cluster terminated', message='The cluster terminated before the step finished')
+                for step in steps.select(step_states=[EmrStepState.PENDING, EmrStepState.RUNNING]):
+                    state = EmrStepState.CANCELLED if step.state == EmrStepState.PENDING else EmrStepState.INTERRUPTED
+                    make_step_terminal(step, failure_details, state).apply(step)
+                    steps.update(step)
+                    updated_steps.append(step)
+                steps.compact()
             self.clusters[cluster_id].terminate_on_no_steps()
-        self.clusters[cluster_id].steps = steps
+        if updated_steps or cluster_update is not None:
+            self.save_cluster(self.clusters[cluster_id], updated_steps)
+
+    def terminate_idle_clusters(self, now: datetime) -> List[str]:
+        """Terminates the clusters which have been idle for longer than their IdleTimeout, returning their ids."""
+        terminated = []
+        with self.registry_lock.read():
+            self.reattach_clusters()
+            self.apply_status_updates()
+            for cluster in self.clusters.values():
+                idle_timeout = cluster.idle_timeout or configuration.idle_timeout_seconds
+                if not idle_timeout or cluster.termination_protected:
+                    continue
+                with cluster.lock:
+                    idle_seconds = cluster.idle_seconds(now)
+                    if idle_seconds is not None and idle_seconds >= idle_timeout:
+                        cluster.terminate('Cluster was terminated after being idle for {} seconds'.format(idle_timeout))
+                        terminated.append(cluster.id)
+        return terminated
+
+    def evict_terminated_clusters(self, now: datetime) -> List[str]:
+        """
+        Forgets the clusters which terminated longest ago beyond LOCALEMR_MAX_TERMINATED_CLUSTERS, and those
+        which terminated more than LOCALEMR_TERMINATED_CLUSTER_RETENTION_SECONDS ago, returning their ids.
+        """
+        if self.store is not None:
+            terminated = self.store.ended_clusters(self.region_name, EMR_CLUSTER_TERMINAL_STATES)
+        else:
+            terminated = sorted(
+                (
+                    (cluster.id, (cluster.end_datetime or cluster.creation_datetime).timestamp())
+                    for cluster in self.clusters.values() if cluster.state in EMR_CLUSTER_TERMINAL_STATES
+                ),
+                key=lambda ended_cluster: ended_cluster[1],
+            )
+        evicted = []
+        if configuration.max_terminated_clusters and len(terminated) > configuration.max_terminated_clusters:
+            evicted = [cluster_id for cluster_id, _ in terminated[:-configuration.max_terminated_clusters]]
+            terminated = terminated[-configuration.max_terminated_clusters:]
+        if configuration.terminated_cluster_retention_seconds:
+            evicted.extend(
+                cluster_id for cluster_id, ended in terminated
+                if now.timestamp() - ended >= configuration.terminated_cluster_retention_seconds
+            )
+        for cluster_id in evicted:
+            # Clusters which are only in the StateStore have nothing in memory to drop
+            cluster = self.clusters.pop(cluster_id, None)
+            if cluster is not None:
+                for instance_group_id in cluster.instance_group_ids:
+                    self.instance_groups.pop(instance_group_id, None)
+            self.supervisor.forget(cluster_id)
+            self.status_collector.discard(cluster_id)
+        if self.store is not None and evicted:
+            self.store.delete_clusters(evicted)
+        return evicted
 
-    def run_job_flow(self, **kwargs):
+    def run_job_flow(self, start=True, **kwargs):
+        """
+        Parameters
+        ----------
+        start : Whether to start the cluster right away. RunJobFlow starts it with start_cluster once it has
+            added the cluster's instance groups, as they determine the resources it is started with.
+        """
+        self.status_collector.start()
+        cluster_reaper.start()
         fake_cluster = LocalFakeCluster(emr_backend=self, **kwargs)
-        fake_cluster.cluster_process_queue.put(fake_cluster.create_cluster_subset())
-        step_reader_process = Process(
-            target=run_fork_exec,
-            args=(
-                self.fork_exec,
-                fake_cluster.step_process_queue,
-                fake_cluster.step_status_queue,
-                fake_cluster.cluster_process_queue,
-                fake_cluster.cluster_status_queue,
-            ),
-        )
-        step_reader_process.daemon = True
-        step_reader_process.start()
+        if start:
+            self.start_cluster(fake_cluster.id)
         return fake_cluster
 
-    add_applcations = update_wrapper(ElasticMapReduceBackend.add_applications)
-    add_job_flow_steps = update_wrapper(ElasticMapReduceBackend.add_job_flow_steps)
-    add_tags = update_wrapper(ElasticMapReduceBackend.add_tags)
-    describe_job_flows = update_wrapper(ElasticMapReduceBackend.describe_job_flows)
-    describe_step = update_wrapper(ElasticMapReduceBackend.describe_step)
-    get_cluster = update_wrapper(ElasticMapReduceBackend.get_cluster)
-    list_bootstrap_actions = update_wrapper(ElasticMapReduceBackend.list_bootstrap_actions)
-    list_clusters = update_wrapper(ElasticMapReduceBackend.list_clusters)
-    list_steps = update_wrapper(ElasticMapReduceBackend.list_steps)
-    modify_instance_groups = update_wrapper(ElasticMapReduceBackend.modify_instance_groups)
-    remove_tags = update_wrapper(ElasticMapReduceBackend.remove_tags)
-    set_visible_to_all_users = update_wrapper(ElasticMapReduceBackend.set_visible_to_all_users)
-    set_termination_protection = update_wrapper(ElasticMapReduceBackend.set_termination_protection)
-    terminate_job_flows = update_wrapper(ElasticMapReduceBackend.terminate_job_flows)
-
-
-emr_backends = {}
-
-for region in Session().get_available_regions("emr"):
-    emr_backends[region] = LocalElasticMapReduceBackend(region)
-for region in Session().get_available_regions("emr", partition_name="aws-us-gov"):
-    emr_backends[region] = LocalElasticMapReduceBackend(region)
-for region in Session().get_available_regions("emr", partition_name="aws-cn"):
-    emr_backends[region] = LocalElasticMapReduceBackend(region)
+    def start_cluster(self, cluster_id):
+        cluster = self.clusters[cluster_id]
+        self.supervisor.submit(cluster.id, cluster.create_cluster_subset())
+        self.save_cluster(cluster, cluster.steps)
+        return cluster
+
+    def add_instance_groups(self, cluster_id, instance_groups):
+        result_groups = super().add_instance_groups(cluster_id, instance_groups)
+        # moto adds the master and core groups before the state of the cluster is set, it is saved once it is started
+        if getattr(self.clusters[cluster_id], 'state', None) is not None:
+            self.save_cluster(self.clusters[cluster_id])
+        return result_groups
+
+    def add_job_flow_steps(self, job_flow_id, steps):
+        added_steps = super().add_job_flow_steps(job_flow_id, steps)
+        self.save_cluster(self.clusters[job_flow_id], added_steps)
+        return added_steps
+
+    def list_clusters(self, cluster_states=None, created_after=None, created_before=None, marker=None):
+        """Moto's ListClusters, which queries the StateStore rather than loading every cluster when there is one."""
+        if self.store is None:
+            return super().list_clusters(cluster_states, created_after, created_before, marker)
+        max_items = 50
+        start_idx = 0 if marker is None else int(marker)
+        cluster_ids = self.store.cluster_ids(
+            self.region_name,
+            cluster_states,
+            dtparse(created_after) if created_after else None,
+            dtparse(created_before) if created_before else None,
+            offset=start_idx,
+            limit=max_items + 1,
+        )
+        marker = None if len(cluster_ids) <= max_items else str(start_idx + max_items)
+        return [self.clusters[cluster_id] for cluster_id in cluster_ids[:max_items]], marker
+
+    def describe_job_flows(self, job_flow_ids=None, job_flow_states=None, created_after=None, created_before=None):
+        if self.store is not None:
+            # Moto goes over the clusters in memory, so those of the last two months it returns are loaded first
+            for cluster_id in job_flow_ids or self.store.cluster_ids(self.region_name, created_after=datetime.now(pytz.utc) - timedelta(days=60)):
+                self.clusters.get(cluster_id)
+        return super().describe_job_flows(job_flow_ids, job_flow_states, created_after, created_before)
+
+    def modify_cluster(self, cluster_id, step_concurrency_level):
+        cluster = self.get_cluster(cluster_id)
+        if step_concurrency_level is not None:
+            cluster.set_step_concurrency_level(step_concurrency_level)
+        return cluster
+
+    def modify_instance_groups(self, instance_groups):
+        modified_group_ids = {instance_group['instance_group_id'] for instance_group in instance_groups}
+        clusters = [cluster for cluster in self.clusters.values() if modified_group_ids.intersection(cluster.instance_group_ids)]
+        with cluster_locks(clusters):
+            result_groups = super().modify_instance_groups(instance_groups)
+            for cluster in clusters:
+                if cluster.state not in EMR_CLUSTER_TERMINAL_STATES + [EmrClusterState.TERMINATING]:
+                    cluster.resize()
+                    self.save_cluster(cluster)
+        return result_groups
+
+    def get_instance_groups(self, instance_group_ids):
+        # Moto goes over the groups of every cluster to find those of one
+        return [self.instance_groups[group_id] for group_id in instance_group_ids if group_id in self.instance_groups]
+
+    def describe_step(self, cluster_id, step_id):
+        return self.clusters[cluster_id].steps.get(step_id)
+
+    def list_steps(self, cluster_id, marker=None, step_ids=None, step_states=None):
+        max_items = 50
+        steps = self.clusters[cluster_id].steps
+        if step_ids or step_states:
+            steps = steps.select(step_ids=step_ids, step_states=step_states)
+        start_idx = 0 if marker is None else int(marker)
+        marker = None if len(steps) <= start_idx + max_items else str(start_idx + max_items)
+        return steps[start_idx:start_idx + max_items], marker
+
+    add_applications = cluster_update_wrapper(persist_wrapper(ElasticMapReduceBackend.add_applications))
+    add_instance_groups = cluster_update_wrapper(add_instance_groups)
+    add_job_flow_steps = cluster_update_wrapper(add_job_flow_steps)
+    add_tags = cluster_update_wrapper(persist_wrapper(ElasticMapReduceBackend.add_tags))
+    describe_job_flows = update_wrapper(describe_job_flows)
+    describe_step = cluster_update_wrapper(describe_step)
+    evict_terminated_clusters = registry_write_wrapper(evict_terminated_clusters)
+    get_cluster = cluster_update_wrapper(ElasticMapReduceBackend.get_cluster)
+    list_bootstrap_actions = cluster_update_wrapper(ElasticMapReduceBackend.list_bootstrap_actions)
+    list_clusters = update_wrapper(list_clusters)
+    list_instance_groups = cluster_update_wrapper(ElasticMapReduceBackend.list_instance_groups)
+    list_steps = cluster_update_wrapper(list_steps)
+    modify_cluster = cluster_update_wrapper(persist_wrapper(modify_cluster))
+    modify_instance_groups = update_wrapper(modify_instance_groups)
+    remove_tags = cluster_update_wrapper(persist_wrapper(ElasticMapReduceBackend.remove_tags))
+    reset = registry_write_wrapper(reset)
+    run_job_flow = registry_write_wrapper(run_job_flow)
+    set_visible_to_all_users = update_wrapper(lock_wrapper(persist_wrapper(ElasticMapReduceBackend.set_visible_to_all_users)))
+    set_termination_protection = update_wrapper(lock_wrapper(persist_wrapper(ElasticMapReduceBackend.set_termination_protection)))
+    start_cluster = cluster_update_wrapper(start_cluster)
+    terminate_job_flows = update_wrapper(lock_wrapper(ElasticMapReduceBackend.terminate_job_flows))
+
+
+@functools.lru_cache(maxsize=None)
+def emr_regions() -> FrozenSet[str]:
+    session = Session()
+    return frozenset(
+        region for partition_name in ('aws', 'aws-us-gov', 'aws-cn')
+        for region in session.get_available_regions('emr', partition_name=partition_name)
+    )
+
+
+class RegionBackends(dict):
+    """
+    The backend of each region, built the first time the region is asked for. Like the ClusterRegistry,
+    iterating only goes over the backends which were built, which are the only ones moto has to reset.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def __missing__(self, region):
+        if region not in emr_regions():
+            raise KeyError(region)
+        with self._lock:
+            if not super().__contains__(region):
+                self[region] = LocalElasticMapReduceBackend(region)
+            return super().__getitem__(region)
+
+    def __contains__(self, region) -> bool:
+        return super().__contains__(region) or region in emr_regions()
+
+    def get(self, region, default=None):
+        try:
+            return self[region]
+        except KeyError:
+            return default
+
+
+emr_backends = RegionBackends()
+if state_store is not None:
+    # The regions with clusters to reattach to are built right away
+    for active_region in state_store.regions(ACTIVE_CLUSTER_STATES):
+        emr_backends.get(active_region)
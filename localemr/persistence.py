@@ -0,0 +1,269 @@
+"""
+With LOCALEMR_STATE_DB, the clusters and steps of every backend are also saved to a SQLite database, so
+that restarting localemr doesn't lose track of them. Each cluster and step is saved as a pickled record,
+next to the columns it is queried by: its region, state and creation time for ListClusters, its cluster
+and position for loading the steps of a cluster.
+
+Saves are only queued by the callers, who are serving API requests. A thread writes the queued records
+in a single transaction every FLUSH_INTERVAL, a record saved several times in between being written
+once. The database is in WAL mode, so that these commits don't have to wait for readers, and a crash
+loses at most the last FLUSH_INTERVAL of changes.
+
+Only the clusters which were running when localemr stopped are read back at startup, to reattach to their
+containers. Any other cluster is loaded from the database the first time it is asked for, through the
+ClusterRegistry standing in for the backend's dict of clusters.
+"""
+import pickle
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# The seconds between two commits of the queued saves
+FLUSH_INTERVAL = 0.5
+# The number of queued saves which are committed without waiting for the interval
+FLUSH_BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clusters (
+    id TEXT PRIMARY KEY,
+    region TEXT NOT NULL,
+    state TEXT,
+    created_at REAL NOT NULL,
+    ended_at REAL,
+    record BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS clusters_by_state ON clusters (region, state, created_at);
+CREATE INDEX IF NOT EXISTS clusters_by_creation ON clusters (region, created_at);
+CREATE TABLE IF NOT EXISTS steps (
+    id TEXT PRIMARY KEY,
+    cluster_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    state TEXT,
+    record BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS steps_by_cluster ON steps (cluster_id, position);
+"""
+
+
+def timestamp(value: Optional[datetime]) -> Optional[float]:
+    return value.timestamp() if value is not None else None
+
+
+class StateStore:
+
+    def __init__(self, path: str):
+        """
+        Parameters
+        ----------
+        path : The SQLite database, created if it doesn't exist
+        """
+        self.path = path
+        # Only used under _lock, by the writer thread and the threads serving requests
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._pending_clusters: Dict[str, tuple] = {}
+        self._pending_steps: Dict[str, tuple] = {}
+        self._flush_needed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put_cluster(self, region: str, cluster_id: str, state: str, created_at: datetime, ended_at: Optional[datetime], record: Any):
+        row = (cluster_id, region, state, timestamp(created_at), timestamp(ended_at), pickle.dumps(record))
+        with self._lock:
+            self._pending_clusters[cluster_id] = row
+            self._notify_if_full()
+
+    def put_step(self, cluster_id: str, step_id: str, position: int, state: str, record: Any):
+        row = (step_id, cluster_id, position, state, pickle.dumps(record))
+        with self._lock:
+            self._pending_steps[step_id] = row
+            self._notify_if_full()
+
+    def get_cluster(self, region: str, cluster_id: str) -> Optional[Any]:
+        with self._lock:
+            self._flush()
+            row = self._connection.execute(
+                'SELECT record FROM clusters WHERE id = ? AND region = ?', (cluster_id, region),
+            ).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def get_steps(self, cluster_id: str) -> List[Any]:
+        with self._lock:
+            self._flush()
+            rows = self._connection.execute(
+                'SELECT record FROM steps WHERE cluster_id = ? ORDER BY position', (cluster_id,),
+            ).fetchall()
+        return [pickle.loads(row[0]) for row in rows]
+
+    def cluster_ids(
+            self,
+            region: str,
+            states: Optional[Iterable[str]] = None,
+            created_after: Optional[datetime] = None,
+            created_before: Optional[datetime] = None,
+            offset: int = 0,
+            limit: int = -1) -> List[str]:
+        """
+        Returns
+        -------
+        The ids of the clusters of the region matching the filters, ordered like moto orders ListClusters.
+        """
+        query = 'SELECT id FROM clusters WHERE region = ?'
+        parameters = [region]
+        if states:
+            states = list(states)
+            query += ' AND state IN ({})'.format(', '.join('?' * len(states)))
+            parameters.extend(states)
+        if created_after is not None:
+            query += ' AND created_at > ?'
+            parameters.append(created_after.timestamp())
+        if created_before is not None:
+            query += ' AND created_at < ?'
+            parameters.append(created_before.timestamp())
+        query += ' ORDER BY id LIMIT ? OFFSET ?'
+        parameters.extend([limit, offset])
+        with self._lock:
+            self._flush()
+            return [row[0] for row in self._connection.execute(query, parameters)]
+
+    def regions(self, states: Iterable[str]) -> List[str]:
+        """The regions which have clusters in the given states."""
+        states = list(states)
+        query = 'SELECT DISTINCT region FROM clusters WHERE state IN ({})'.format(', '.join('?' * len(states)))
+        with self._lock:
+            self._flush()
+            return [row[0] for row in self._connection.execute(query, states)]
+
+    def ended_clusters(self, region: str, states: Iterable[str]) -> List[Tuple[str, float]]:
+        """
+        Returns
+        -------
+        The (id, timestamp it ended, or was created at if it has no end) of the clusters of the region
+        in the given states, those which ended first first.
+        """
+        states = list(states)
+        query = 'SELECT id, COALESCE(ended_at, created_at) AS ended FROM clusters WHERE region = ? AND state IN ({}) ORDER BY ended'.format(
+            ', '.join('?' * len(states)),
+        )
+        with self._lock:
+            self._flush()
+            return self._connection.execute(query, [region] + states).fetchall()
+
+    def delete_clusters(self, cluster_ids: List[str]):
+        """Deletes the clusters and their steps."""
+        with self._lock:
+            self._flush()
+            with self._connection:
+                self._connection.execute('BEGIN')
+                for cluster_id in cluster_ids:
+                    self._connection.execute('DELETE FROM steps WHERE cluster_id = ?', (cluster_id,))
+                    self._connection.execute('DELETE FROM clusters WHERE id = ?', (cluster_id,))
+
+    def delete_region(self, region: str):
+        with self._lock:
+            self._flush()
+            with self._connection:
+                self._connection.execute('BEGIN')
+                self._connection.execute(
+                    'DELETE FROM steps WHERE cluster_id IN (SELECT id FROM clusters WHERE region = ?)', (region,),
+                )
+                self._connection.execute('DELETE FROM clusters WHERE region = ?', (region,))
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._flush_needed.set()
+            self._thread.join()
+            with self._lock:
+                self._flush()
+                self._connection.close()
+
+    def _notify_if_full(self):
+        if len(self._pending_clusters) + len(self._pending_steps) >= FLUSH_BATCH_SIZE:
+            self._flush_needed.set()
+
+    def _flush(self):
+        """Commits the queued saves in one transaction, must be called under _lock."""
+        if not self._pending_clusters and not self._pending_steps:
+            return
+        with self._connection:
+            self._connection.execute('BEGIN')
+            self._connection.executemany('INSERT OR REPLACE INTO clusters VALUES (?, ?, ?, ?, ?, ?)', self._pending_clusters.values())
+            self._connection.executemany('INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?)', self._pending_steps.values())
+        self._pending_clusters = {}
+        self._pending_steps = {}
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._flush_needed.wait(FLUSH_INTERVAL)
+            self._flush_needed.clear()
+            with self._lock:
+                if not self._stopped.is_set():
+                    self._flush()
+
+
+class ClusterRegistry(dict):
+    """
+    The clusters of a backend by id, those which aren't in memory yet being loaded on first access. Only
+    looking a cluster up by id loads it, iterating over the registry only goes over the loaded clusters.
+
+    Request threads look clusters up and iterate over them while others add clusters, so a cluster is loaded
+    once under a lock, and the keys, values and items are copies rather than views of the registry.
+    """
+
+    def __init__(self, load: Callable[[str], Optional[Any]]):
+        """
+        Parameters
+        ----------
+        load : Loads the cluster with an id into the registry and returns it, None if there is no such cluster
+        """
+        super().__init__()
+        self.load = load
+        self._load_lock = threading.RLock()
+
+    def __missing__(self, cluster_id):
+        cluster = self._load(cluster_id)
+        if cluster is None:
+            raise KeyError(cluster_id)
+        return cluster
+
+    def __contains__(self, cluster_id) -> bool:
+        return super().__contains__(cluster_id) or self._load(cluster_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def get(self, cluster_id, default=None):
+        try:
+            return self[cluster_id]
+        except KeyError:
+            return default
+
+    def loaded(self, cluster_id) -> Optional[Any]:
+        """The cluster if it is in memory, without loading it."""
+        return super().get(cluster_id)
+
+    def keys(self) -> List[str]:
+        return list(super().keys())
+
+    def values(self) -> List[Any]:
+        return list(super().values())
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return list(super().items())
+
+    def _load(self, cluster_id) -> Optional[Any]:
+        with self._load_lock:
+            # Another thread may have loaded it while this one waited
+            if super().__contains__(cluster_id):
+                return super().__getitem__(cluster_id)
+            return self.load(cluster_id)
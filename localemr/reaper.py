@@ -0,0 +1,74 @@
+"""
+A cluster kept alive when it has no steps holds on to its containers until somebody terminates it, which on
+a shared host nobody remembers to do. The reaper terminates the clusters which have been idle, WAITING with
+no step pending or running, for longer than the IdleTimeout of their AutoTerminationPolicy, or than
+LOCALEMR_IDLE_TIMEOUT_SECONDS for clusters without one.
+
+The status updates of every cluster are applied as the reaper goes, so that clusters which terminate once
+they run out of steps do so without waiting for an API call to describe them. Terminated clusters are kept
+by default. Given LOCALEMR_MAX_TERMINATED_CLUSTERS or LOCALEMR_TERMINATED_CLUSTER_RETENTION_SECONDS, they are
+forgotten once there are more of them, or once they have been terminated for longer, so that a long running
+server doesn't grow.
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional
+
+import pytz
+
+# How often in seconds the clusters are checked, which bounds how late past its timeout a cluster is terminated
+REAP_INTERVAL = 10
+
+
+class ClusterReaper:
+
+    def __init__(self, get_backends: Callable[[], Iterable], interval: float = REAP_INTERVAL):
+        """
+        Parameters
+        ----------
+        get_backends : Returns the backends whose clusters are reaped
+        interval : The seconds between two checks of the clusters
+        """
+        self.get_backends = get_backends
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def reap(self, now: Optional[datetime] = None) -> List[str]:
+        """
+        Returns
+        -------
+        The ids of the clusters which were terminated for being idle.
+        """
+        now = now or datetime.now(pytz.utc)
+        terminated = []
+        for backend in list(self.get_backends()):
+            terminated.extend(backend.terminate_idle_clusters(now))
+            evicted = backend.evict_terminated_clusters(now)
+            if evicted:
+                logging.info("Forgot terminated clusters: %s", evicted)
+        return terminated
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                terminated = self.reap()
+            # pylint: disable=broad-except
+            except Exception as e:
+                logging.exception(e)
+                continue
+            if terminated:
+                logging.info("Terminated idle clusters: %s", terminated)
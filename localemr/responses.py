@@ -1,7 +1,12 @@
 from __future__ import unicode_literals
+import json
 import functools
+from urllib.parse import urlparse
+from moto.emr.exceptions import EmrError
 from moto.emr.responses import ElasticMapReduceResponse, generate_boto3_response
+from localemr.config import configuration
 from localemr.models import emr_backends
+from localemr.step_logs import read_step_log
 from localemr.common import parse_release_label
 
 
@@ -15,17 +20,64 @@ def validate_wrapper(func):
     return wrapper
 
 
+class ClusterLaunch:
+    """
+    The backend as moto's RunJobFlow sees it, which passes along the parameters only localemr supports, and
+    creates the cluster without starting it, as moto adds the cluster's instance groups afterwards.
+    """
+
+    def __init__(self, backend, **kwargs):
+        self.backend = backend
+        self.kwargs = kwargs
+        self.cluster = None
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def run_job_flow(self, **kwargs):
+        self.cluster = self.backend.run_job_flow(start=False, **kwargs, **self.kwargs)
+        return self.cluster
+
+
+def launch_wrapper(func):
+    """Run moto's RunJobFlow against a ClusterLaunch, then start the cluster it created."""
+    @functools.wraps(func)
+    def wrapper(self):
+        self.launch = ClusterLaunch(
+            emr_backends[self.region],
+            step_concurrency_level=self._get_int_param("StepConcurrencyLevel", 1),
+            idle_timeout=self._get_int_param("AutoTerminationPolicy.IdleTimeout"),
+        )
+        try:
+            return func(self)
+        finally:
+            cluster, self.launch = self.launch.cluster, None
+            if cluster is not None:
+                self.backend.start_cluster(cluster.id)
+    return wrapper
+
+
 # pylint: disable=abstract-method
 class LocalElasticMapReduceResponse(ElasticMapReduceResponse):
 
+    # The backend RunJobFlow is handed while it creates a cluster, see launch_wrapper
+    launch = None
+
     @property
     def backend(self):
-        return emr_backends[self.region]
+        return self.launch if self.launch is not None else emr_backends[self.region]
 
     @generate_boto3_response
     def cancel_steps(self):
         pass
 
+    @generate_boto3_response("DescribeCluster")
+    def describe_cluster(self):
+        cluster_id = self._get_param("ClusterId")
+        cluster = self.backend.get_cluster(cluster_id)
+        template = self.response_template(DESCRIBE_CLUSTER_TEMPLATE)
+        return template.render(cluster=cluster)
+
     @generate_boto3_response("DescribeStep")
     def describe_step(self):
         cluster_id = self._get_param("ClusterId")
@@ -46,8 +98,72 @@ class LocalElasticMapReduceResponse(ElasticMapReduceResponse):
         template = self.response_template(LIST_STEPS_TEMPLATE)
         return template.render(steps=steps, marker=marker)
 
-    run_job_flow = validate_wrapper(ElasticMapReduceResponse.run_job_flow)
+    @generate_boto3_response("ModifyCluster")
+    def modify_cluster(self):
+        cluster_id = self._get_param("ClusterId")
+        step_concurrency_level = self._get_int_param("StepConcurrencyLevel")
+        cluster = self.backend.modify_cluster(cluster_id, step_concurrency_level)
+        template = self.response_template(MODIFY_CLUSTER_TEMPLATE)
+        return template.render(cluster=cluster)
+
+    @generate_boto3_response("ModifyInstanceFleet")
+    def modify_instance_fleet(self):
+        raise EmrError(
+            error_type="ValidationException",
+            message="Instance fleets are not supported in this version of EMR, use instance groups",
+            template="error_json",
+        )
+
+    run_job_flow = validate_wrapper(launch_wrapper(ElasticMapReduceResponse.run_job_flow))
+
+    @classmethod
+    def worker_pool(cls, request, full_url, headers):
+        """Not part of the EMR API, reports how many clusters each worker process is running."""
+        response = cls()
+        response.setup_class(request, full_url, headers)
+        return 200, {'Content-Type': 'application/json'}, json.dumps(response.backend.supervisor.occupancy())
+
+    @classmethod
+    def step_queue_wait(cls, request, full_url, headers):
+        """Not part of the EMR API, reports how long a step waited for the StepScheduler to admit it."""
+        response = cls()
+        response.setup_class(request, full_url, headers)
+        cluster_id, _, step_id, _ = urlparse(full_url).path.split('/')[-4:]
+        try:
+            step = response.backend.describe_step(cluster_id, step_id)
+        except KeyError:
+            step = None
+        if step is None:
+            message = 'Step {} of cluster {} does not exist'.format(step_id, cluster_id)
+            return 404, {'Content-Type': 'application/json'}, json.dumps({'message': message})
+        body = {'clusterId': cluster_id, 'stepId': step_id, 'state': step.state, 'queueWaitSeconds': step.queue_wait_seconds}
+        return 200, {'Content-Type': 'application/json'}, json.dumps(body)
 
+    @classmethod
+    def step_log(cls, request, full_url, headers):
+        """Not part of the EMR API, reads a range of lines of a step's spooled log, like Livy's /batches/{id}/log."""
+        response = cls()
+        response.setup_class(request, full_url, headers)
+        cluster_id, _, step_id, _ = urlparse(full_url).path.split('/')[-4:]
+        start = response._get_int_param('from', 0)
+        size = response._get_int_param('size', 100)
+        try:
+            lines = read_step_log(configuration.localemr_log_dir, cluster_id, step_id, start, size)
+        except FileNotFoundError:
+            message = 'Step {} of cluster {} has no log'.format(step_id, cluster_id)
+            return 404, {'Content-Type': 'application/json'}, json.dumps({'message': message})
+        body = {'clusterId': cluster_id, 'stepId': step_id, 'from': start, 'size': len(lines), 'log': lines}
+        return 200, {'Content-Type': 'application/json'}, json.dumps(body)
+
+
+MODIFY_CLUSTER_TEMPLATE = """<ModifyClusterResponse xmlns="http://elasticmapreduce.amazonaws.com/doc/2009-03-31">
+  <ModifyClusterResult>
+    <StepConcurrencyLevel>{{ cluster.step_concurrency_level }}</StepConcurrencyLevel>
+  </ModifyClusterResult>
+  <ResponseMetadata>
+    <RequestId>df6f4f4a-ed85-11dd-9877-6fad448a8419</RequestId>
+  </ResponseMetadata>
+</ModifyClusterResponse>"""
 
 DESCRIBE_STEP_TEMPLATE = """<DescribeStepResponse xmlns="http://elasticmapreduce.amazonaws.com/doc/2009-03-31">
   <DescribeStepResult>
@@ -153,3 +269,104 @@ LIST_STEPS_TEMPLATE = """<ListStepsResponse xmlns="http://elasticmapreduce.amazo
     <RequestId>df6f4f4a-ed85-11dd-9877-6fad448a8419</RequestId>
   </ResponseMetadata>
 </ListStepsResponse>"""
+
+DESCRIBE_CLUSTER_TEMPLATE = """<DescribeClusterResponse xmlns="http://elasticmapreduce.amazonaws.com/doc/2009-03-31">
+  <DescribeClusterResult>
+    <Cluster>
+      <Applications>
+        {% for application in cluster.applications %}
+        <member>
+          <Name>{{ application.name }}</Name>
+          <Version>{{ application.version }}</Version>
+        </member>
+        {% endfor %}
+      </Applications>
+      <AutoTerminate>{{ (not cluster.keep_job_flow_alive_when_no_steps)|lower }}</AutoTerminate>
+      <Configurations>
+        {% for configuration in cluster.configurations %}
+        <member>
+          <Classification>{{ configuration['classification'] }}</Classification>
+          <Properties>
+            {% for key, value in configuration['properties'].items() %}
+            <entry>
+              <key>{{ key }}</key>
+              <value>{{ value }}</value>
+            </entry>
+            {% endfor %}
+          </Properties>
+        </member>
+        {% endfor %}
+      </Configurations>
+      {% if cluster.custom_ami_id is not none %}
+      <CustomAmiId>{{ cluster.custom_ami_id }}</CustomAmiId>
+      {% endif %}
+      <Ec2InstanceAttributes>
+        <AdditionalMasterSecurityGroups>
+        {% for each in cluster.additional_master_security_groups %}
+          <member>{{ each }}</member>
+        {% endfor %}
+        </AdditionalMasterSecurityGroups>
+        <AdditionalSlaveSecurityGroups>
+        {% for each in cluster.additional_slave_security_groups %}
+          <member>{{ each }}</member>
+        {% endfor %}
+        </AdditionalSlaveSecurityGroups>
+        <Ec2AvailabilityZone>{{ cluster.availability_zone }}</Ec2AvailabilityZone>
+        <Ec2KeyName>{{ cluster.ec2_key_name }}</Ec2KeyName>
+        <Ec2SubnetId>{{ cluster.ec2_subnet_id }}</Ec2SubnetId>
+        <IamInstanceProfile>{{ cluster.role }}</IamInstanceProfile>
+        <EmrManagedMasterSecurityGroup>{{ cluster.master_security_group }}</EmrManagedMasterSecurityGroup>
+        <EmrManagedSlaveSecurityGroup>{{ cluster.slave_security_group }}</EmrManagedSlaveSecurityGroup>
+        <ServiceAccessSecurityGroup>{{ cluster.service_access_security_group }}</ServiceAccessSecurityGroup>
+      </Ec2InstanceAttributes>
+      <Id>{{ cluster.id }}</Id>
+      <LogUri>{{ cluster.log_uri }}</LogUri>
+      <MasterPublicDnsName>ec2-184-0-0-1.us-west-1.compute.amazonaws.com</MasterPublicDnsName>
+      <Name>{{ cluster.name }}</Name>
+      <NormalizedInstanceHours>{{ cluster.normalized_instance_hours }}</NormalizedInstanceHours>
+      {% if cluster.release_label is not none %}
+      <ReleaseLabel>{{ cluster.release_label }}</ReleaseLabel>
+      {% endif %}
+      {% if cluster.requested_ami_version is not none %}
+      <RequestedAmiVersion>{{ cluster.requested_ami_version }}</RequestedAmiVersion>
+      {% endif %}
+      {% if cluster.running_ami_version is not none %}
+      <RunningAmiVersion>{{ cluster.running_ami_version }}</RunningAmiVersion>
+      {% endif %}
+      <SecurityConfiguration/>
+      <ServiceRole>{{ cluster.service_role }}</ServiceRole>
+      <Status>
+        <State>{{ cluster.state }}</State>
+        <StateChangeReason>
+          {% if cluster.last_state_change_reason is not none %}
+          <Message>{{ cluster.last_state_change_reason }}</Message>
+          {% endif %}
+          <Code>USER_REQUEST</Code>
+        </StateChangeReason>
+        <Timeline>
+          <CreationDateTime>{{ cluster.creation_datetime.isoformat() }}</CreationDateTime>
+          {% if cluster.end_datetime is not none %}
+          <EndDateTime>{{ cluster.end_datetime.isoformat() }}</EndDateTime>
+          {% endif %}
+          {% if cluster.ready_datetime is not none %}
+          <ReadyDateTime>{{ cluster.ready_datetime.isoformat() }}</ReadyDateTime>
+          {% endif %}
+        </Timeline>
+      </Status>
+      <Tags>
+        {% for tag_key, tag_value in cluster.tags.items() %}
+        <member>
+          <Key>{{ tag_key }}</Key>
+          <Value>{{ tag_value }}</Value>
+        </member>
+        {% endfor %}
+      </Tags>
+      <TerminationProtected>{{ cluster.termination_protected|lower }}</TerminationProtected>
+      <StepConcurrencyLevel>{{ cluster.step_concurrency_level }}</StepConcurrencyLevel>
+      <VisibleToAllUsers>{{ cluster.visible_to_all_users|lower }}</VisibleToAllUsers>
+    </Cluster>
+  </DescribeClusterResult>
+  <ResponseMetadata>
+    <RequestId>aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee</RequestId>
+  </ResponseMetadata>
+</DescribeClusterResponse>"""
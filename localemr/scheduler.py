@@ -0,0 +1,187 @@
+"""
+Every cluster would otherwise hand its steps to the exec backend as soon as they arrive, and twenty clusters
+launching Spark drivers on one host run it out of memory. The scheduler sits between the API and the workers
+with a view of the whole host: steps stay PENDING in their cluster's queue until they fit in the configured
+limits on concurrent steps, cores and memory, as well as in their cluster's StepConcurrencyLevel.
+
+Capacity is shared fairly: the next step admitted is the head of the queue of the cluster running the fewest
+steps, ties going to the step whose ActionOnFailure is most severe and then to the step queued first.
+Steps are admitted strictly in that order, so a large step is never starved by smaller ones behind it.
+"""
+import itertools
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pytz
+from localemr.common import ActionOnFailure, LocalFakeStep
+
+# The resources Spark allocates when a step doesn't ask for any, with YARN's default of 2 executors
+DEFAULT_DRIVER_CORES = 1
+DEFAULT_DRIVER_MEMORY_MB = 1024
+DEFAULT_NUM_EXECUTORS = 2
+DEFAULT_EXECUTOR_CORES = 1
+DEFAULT_EXECUTOR_MEMORY_MB = 1024
+
+# A failing step which terminates its cluster is worth knowing about first
+ACTION_ON_FAILURE_PRIORITY = {
+    ActionOnFailure.TERMINATE_JOB_FLOW: 0,
+    ActionOnFailure.TERMINATE_CLUSTER: 0,
+    ActionOnFailure.CANCEL_AND_WAIT: 1,
+    ActionOnFailure.CONTINUE: 2,
+}
+
+SPARK_SUBMIT_OPTIONS = {
+    '--driver-cores': 'spark.driver.cores',
+    '--driver-memory': 'spark.driver.memory',
+    '--num-executors': 'spark.executor.instances',
+    '--executor-cores': 'spark.executor.cores',
+    '--executor-memory': 'spark.executor.memory',
+}
+
+
+def parse_memory_mb(memory: str) -> int:
+    """Parses a JVM memory string like Spark does, '512m' or '2g', a number without a unit being in MB."""
+    memory = memory.strip().lower().rstrip('b')
+    units = {'k': 1 / 1024, 'm': 1, 'g': 1024, 't': 1024 ** 2}
+    if memory and memory[-1] in units:
+        return int(float(memory[:-1]) * units[memory[-1]])
+    return int(memory)
+
+
+class StepDemand:
+    """The cores and memory a step's Spark application asks for, as given to spark-submit."""
+
+    def __init__(self, cores: int, memory_mb: int):
+        self.cores = cores
+        self.memory_mb = memory_mb
+
+    @classmethod
+    def from_args(cls, args: List[str]) -> 'StepDemand':
+        conf = {}
+        for option, value in zip(args, args[1:]):
+            if option in SPARK_SUBMIT_OPTIONS:
+                conf[SPARK_SUBMIT_OPTIONS[option]] = value
+            elif option == '--conf' and '=' in value:
+                key, conf_value = value.split('=', 1)
+                conf.setdefault(key, conf_value)
+        try:
+            executors = int(conf.get('spark.executor.instances', DEFAULT_NUM_EXECUTORS))
+            cores = int(conf.get('spark.driver.cores', DEFAULT_DRIVER_CORES)) + \
+                executors * int(conf.get('spark.executor.cores', DEFAULT_EXECUTOR_CORES))
+            memory_mb = parse_memory_mb(conf.get('spark.driver.memory', str(DEFAULT_DRIVER_MEMORY_MB))) + \
+                executors * parse_memory_mb(conf.get('spark.executor.memory', str(DEFAULT_EXECUTOR_MEMORY_MB)))
+        except ValueError:
+            # Left for spark-submit to reject
+            return cls(DEFAULT_DRIVER_CORES, DEFAULT_DRIVER_MEMORY_MB)
+        return cls(cores, memory_mb)
+
+
+class ClusterQueue:
+
+    def __init__(self, concurrency: int = 1):
+        self.concurrency = concurrency
+        self.steps = deque()
+        self.running: Dict[str, StepDemand] = {}
+
+
+class StepScheduler:
+    """
+    Not thread safe, the Supervisor calls it under its lock. The methods return the steps which
+    were admitted as a result of the call, for the caller to send to the workers.
+    """
+
+    def __init__(self, max_steps: int = 0, max_cores: int = 0, max_memory_mb: int = 0):
+        """
+        Parameters
+        ----------
+        max_steps : The number of steps which may run at once on the host, 0 for no limit
+        max_cores : The number of cores the running steps may ask for, 0 for no limit
+        max_memory_mb : The memory the running steps may ask for, 0 for no limit
+        """
+        self.max_steps = max_steps
+        self.max_cores = max_cores
+        self.max_memory_mb = max_memory_mb
+        self._clusters: Dict[str, ClusterQueue] = {}
+        self._sequence = itertools.count()
+        self._queued_at: Dict[str, int] = {}
+
+    def set_concurrency(self, cluster_id: str, concurrency: int) -> List[LocalFakeStep]:
+        self._cluster(cluster_id).concurrency = concurrency
+        return self._admit()
+
+    def enqueue(self, step: LocalFakeStep) -> List[LocalFakeStep]:
+        self._cluster(step.cluster_id).steps.append(step)
+        self._queued_at[step.id] = next(self._sequence)
+        return self._admit()
+
+    def finish(self, cluster_id: str, step_id: str) -> List[LocalFakeStep]:
+        """Frees the resources of a step which reached a terminal state."""
+        cluster = self._clusters.get(cluster_id)
+        if cluster is None or cluster.running.pop(step_id, None) is None:
+            return []
+        return self._admit()
+
+    def remove_cluster(self, cluster_id: str) -> List[LocalFakeStep]:
+        """Drops the queue of a cluster which terminated and frees the resources of its steps."""
+        cluster = self._clusters.pop(cluster_id, None)
+        if cluster is None:
+            return []
+        for step in cluster.steps:
+            self._queued_at.pop(step.id, None)
+        return self._admit()
+
+    def reset(self):
+        self._clusters = {}
+        self._queued_at = {}
+
+    def usage(self) -> dict:
+        running = [demand for cluster in self._clusters.values() for demand in cluster.running.values()]
+        return {
+            'limits': {'steps': self.max_steps, 'cores': self.max_cores, 'memory_mb': self.max_memory_mb},
+            'running': {
+                'steps': len(running),
+                'cores': sum(demand.cores for demand in running),
+                'memory_mb': sum(demand.memory_mb for demand in running),
+            },
+            'queued': {cluster_id: len(cluster.steps) for cluster_id, cluster in self._clusters.items() if cluster.steps},
+        }
+
+    def _cluster(self, cluster_id: str) -> ClusterQueue:
+        if cluster_id not in self._clusters:
+            self._clusters[cluster_id] = ClusterQueue()
+        return self._clusters[cluster_id]
+
+    def _next(self) -> Optional[ClusterQueue]:
+        candidates = [cluster for cluster in self._clusters.values() if cluster.steps and len(cluster.running) < cluster.concurrency]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda cluster: (
+            len(cluster.running),
+            ACTION_ON_FAILURE_PRIORITY.get(cluster.steps[0].action_on_failure, len(ACTION_ON_FAILURE_PRIORITY)),
+            self._queued_at[cluster.steps[0].id],
+        ))
+
+    def _fits(self, demand: StepDemand) -> bool:
+        running = [running_demand for cluster in self._clusters.values() for running_demand in cluster.running.values()]
+        if not running:
+            # A step which asks for more than the limits runs on its own rather than never
+            return True
+        return (not self.max_steps or len(running) < self.max_steps) and \
+            (not self.max_cores or sum(d.cores for d in running) + demand.cores <= self.max_cores) and \
+            (not self.max_memory_mb or sum(d.memory_mb for d in running) + demand.memory_mb <= self.max_memory_mb)
+
+    def _admit(self) -> List[LocalFakeStep]:
+        admitted = []
+        while True:
+            cluster = self._next()
+            if cluster is None:
+                return admitted
+            demand = StepDemand.from_args(cluster.steps[0].args)
+            if not self._fits(demand):
+                return admitted
+            step = cluster.steps.popleft()
+            del self._queued_at[step.id]
+            cluster.running[step.id] = demand
+            step.admitted_datetime = datetime.now(pytz.utc)
+            admitted.append(step)
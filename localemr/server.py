@@ -0,0 +1,146 @@
+"""
+An HTTP server for EMR alone, in place of moto's server, which sets up a Flask app with every moto service and
+serves it with Werkzeug's development server. Requests are matched against localemr's url_paths and handed to the
+LocalElasticMapReduceResponse handlers as they are when moto mocks boto, without going through Flask.
+
+`application` is a WSGI app, so that localemr can be run by any WSGI server. `serve` runs it with a thread per
+connection and HTTP/1.1 keep-alive, so that the pooled connections of many boto clients aren't set up anew for
+every call. Idle connections are closed after KEEP_ALIVE_TIMEOUT.
+"""
+import argparse
+import logging
+import re
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+from urllib.parse import urlparse
+from wsgiref.util import request_uri
+
+from requests.structures import CaseInsensitiveDict
+from localemr.urls import url_paths
+
+# The seconds an idle keep-alive connection is kept open
+KEEP_ALIVE_TIMEOUT = 30
+# The connections waiting to be accepted, many CI jobs may connect at once
+REQUEST_QUEUE_SIZE = 128
+# The seconds from the start of the process to the server listening, over which a warning is logged
+STARTUP_BUDGET_SECONDS = 3.0
+
+ROUTES: List[Tuple[Pattern, Callable]] = [(re.compile('^' + path.format('')), handler) for path, handler in url_paths.items()]
+
+
+class Request:
+    """The attributes of a request which moto's BaseResponse reads, as on the requests it is given when mocking boto."""
+
+    def __init__(self, method: str, headers: CaseInsensitiveDict, body: bytes):
+        self.method = method
+        self.headers = headers
+        self.body = body
+
+
+def dispatch(method: str, full_url: str, headers: CaseInsensitiveDict, body: bytes) -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Parameters
+    ----------
+    method : The HTTP method of the request
+    full_url : The URL of the request, with its query string
+    headers : The headers of the request
+    body : The body of the request
+
+    Returns
+    -------
+    The status, headers and body of the response.
+    """
+    path = urlparse(full_url).path or '/'
+    for pattern, handler in ROUTES:
+        if pattern.match(path):
+            break
+    else:
+        return 404, {'Content-Type': 'text/plain'}, b'Not Found'
+    try:
+        status, response_headers, response_body = handler(Request(method, headers, body), full_url, headers)
+    # pylint: disable=broad-except
+    except Exception as e:
+        logging.exception(e)
+        return 500, {'Content-Type': 'text/plain'}, b'Internal Server Error'
+    # moto puts the status among the headers as well
+    response_headers = {key: str(value) for key, value in response_headers.items() if key.lower() != 'status'}
+    if isinstance(response_body, str):
+        response_body = response_body.encode('utf-8')
+    return int(status), response_headers, response_body
+
+
+def application(environ, start_response):
+    headers = CaseInsensitiveDict(
+        (key[5:].replace('_', '-'), value) for key, value in environ.items() if key.startswith('HTTP_')
+    )
+    for key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+        if environ.get(key):
+            headers[key.replace('_', '-')] = environ[key]
+    length = int(environ.get('CONTENT_LENGTH') or 0)
+    body = environ['wsgi.input'].read(length) if length else b''
+    status, response_headers, response_body = dispatch(environ['REQUEST_METHOD'], request_uri(environ), headers, body)
+    response_headers['Content-Length'] = str(len(response_body))
+    start_response('{} {}'.format(status, HTTPStatus(status).phrase), list(response_headers.items()))
+    return [response_body]
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEP_ALIVE_TIMEOUT
+
+    def handle_request(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        full_url = 'http://{}{}'.format(self.headers.get('Host', '{}:{}'.format(*self.server.server_address[:2])), self.path)
+        status, headers, response_body = dispatch(self.command, full_url, CaseInsensitiveDict(self.headers.items()), body)
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    do_GET = handle_request
+    do_POST = handle_request
+    do_PUT = handle_request
+    do_DELETE = handle_request
+
+    # pylint: disable=redefined-builtin
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+class LocalEmrServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+
+def serve(host: str, port: int, started_at: Optional[float] = None):
+    """
+    Parameters
+    ----------
+    host : The address to bind
+    port : The port to listen on
+    started_at : The time.perf_counter() the process started at, to log how long the server took to start
+    """
+    server = LocalEmrServer((host, port), RequestHandler)
+    if started_at is not None:
+        startup_seconds = time.perf_counter() - started_at
+        log = logging.warning if startup_seconds > STARTUP_BUDGET_SECONDS else logging.info
+        log("localemr started in %.2fs, the budget is %.2fs", startup_seconds, STARTUP_BUDGET_SECONDS)
+    logging.info("localemr listening on %s:%s", host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main(argv: Optional[List[str]] = None, started_at: Optional[float] = None):
+    parser = argparse.ArgumentParser(description="Local AWS EMR - A local service that imitates AWS EMR ")
+    parser.add_argument('-p', '--port', help='Port to run the service on', type=int, default=3000)
+    parser.add_argument("-H", "--host", type=str, help="Which host to bind", default="0.0.0.0")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    serve(args.host, args.port, started_at)
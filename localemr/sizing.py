@@ -0,0 +1,100 @@
+"""
+A cluster runs in a single container with Spark in local mode, whatever its instances are. To let many
+clusters share one host predictably, the instances of a cluster are translated into the resources of its
+container: their vCPUs and memory added up and scaled down by LOCALEMR_INSTANCE_SCALE_FACTOR. The container
+is limited to those, and the steps running on it are given the matching parallelism and memory.
+"""
+import logging
+import re
+from typing import Dict, Iterable, Tuple
+
+# The memory in GiB per vCPU of an instance family, by the letter of its series
+MEMORY_PER_VCPU_GIB = {
+    'a': 2,
+    'c': 2,
+    'd': 8,
+    'g': 4,
+    'h': 4,
+    'i': 8,
+    'm': 4,
+    'p': 8,
+    'r': 8,
+    't': 4,
+    'x': 16,
+    'z': 8,
+}
+# The vCPUs of the sizes below large, which double from then on, xlarge being 4
+SMALL_SIZE_VCPUS = {'nano': 1, 'micro': 1, 'small': 1, 'medium': 1, 'large': 2}
+INSTANCE_TYPE_PATTERN = re.compile(r'^([a-z]+)\d+[a-z-]*\.(\d*)(nano|micro|small|medium|large|xlarge|metal)$')
+# What an instance type which can't be parsed is taken to be, an m5.xlarge
+DEFAULT_INSTANCE = (4, 16.0)
+
+# The smallest container a cluster is given, Livy and Spark don't start with less
+MIN_CORES = 0.5
+MIN_MEMORY_MB = 1024
+# The CFS period in microseconds of the CPU quota of a container
+CPU_PERIOD = 100000
+# The share of the container's memory given to the Spark driver, the rest is left to Livy and the JVM overhead
+DRIVER_MEMORY_FRACTION = 0.75
+
+
+def instance_type_resources(instance_type: str) -> Tuple[int, float]:
+    """
+    Returns
+    -------
+    The vCPUs and memory in GiB of an EC2 instance type, approximated from its family and size.
+    """
+    match = INSTANCE_TYPE_PATTERN.match(instance_type or '')
+    if match is None or match.group(3) == 'metal' or match.group(1)[0] not in MEMORY_PER_VCPU_GIB:
+        logging.warning("Unknown instance type %s, sizing it as an m5.xlarge", instance_type)
+        return DEFAULT_INSTANCE
+    family, multiplier, size = match.groups()
+    if size == 'xlarge':
+        vcpus = 4 * int(multiplier or 1)
+    else:
+        vcpus = SMALL_SIZE_VCPUS[size]
+    return vcpus, float(vcpus * MEMORY_PER_VCPU_GIB[family[0]])
+
+
+class ClusterSize:
+    """The resources a cluster's container is limited to."""
+
+    def __init__(self, cores: float, memory_mb: int):
+        self.cores = cores
+        self.memory_mb = memory_mb
+
+    @classmethod
+    def from_instances(cls, instances: Iterable[Tuple[str, int]], scale_factor: float) -> 'ClusterSize':
+        """
+        Parameters
+        ----------
+        instances : The (instance type, instance count) of each instance group of the cluster
+        scale_factor : The share of the instances' resources the container gets
+        """
+        vcpus, memory_gib = 0, 0.0
+        for instance_type, instance_count in instances:
+            instance_vcpus, instance_memory_gib = instance_type_resources(instance_type)
+            vcpus += instance_vcpus * instance_count
+            memory_gib += instance_memory_gib * instance_count
+        return cls(
+            max(round(vcpus * scale_factor, 2), MIN_CORES),
+            max(int(memory_gib * 1024 * scale_factor), MIN_MEMORY_MB),
+        )
+
+    def docker_limits(self) -> dict:
+        """
+        The limits as arguments of both creating a container and `docker update`, so that a running cluster
+        can be resized. Which rules out nano_cpus, the equivalent CPU quota is used instead. Without swap,
+        so that memory_mb is all the container gets.
+        """
+        memory = '{}m'.format(self.memory_mb)
+        return {'cpu_period': CPU_PERIOD, 'cpu_quota': int(self.cores * CPU_PERIOD), 'mem_limit': memory, 'memswap_limit': memory}
+
+    def spark_conf(self) -> Dict[str, str]:
+        """Local mode Spark takes its parallelism from the cores of the host, rather than those the container is given."""
+        parallelism = str(max(int(self.cores), 1))
+        return {
+            'spark.default.parallelism': parallelism,
+            'spark.sql.shuffle.partitions': parallelism,
+            'spark.driver.memory': '{}m'.format(int(self.memory_mb * DRIVER_MEMORY_FRACTION)),
+        }
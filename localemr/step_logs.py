@@ -0,0 +1,60 @@
+"""
+The logs of steps are spooled to disk as they are fetched from the exec backend, rather than being held in
+memory and passed around in FailureDetails. FailureDetails only gets the last lines of the log along with
+the path of the full log, which can be read a range of lines at a time through the API.
+"""
+import os
+from collections import deque
+from itertools import islice
+from typing import Iterable, List
+
+# The number of lines at the end of a step's log which are kept in its FailureDetails, as many as Livy returns by default
+LOG_TAIL_LINES = 100
+
+
+def step_log_path(log_dir: str, cluster_id: str, step_id: str) -> str:
+    # Mirrors the layout of the logs EMR writes to the LogUri of a cluster
+    return os.path.join(log_dir, cluster_id, 'steps', step_id, 'stderr')
+
+
+class StepLogSpool:
+    """Appends the log lines of a step to its file as they come in, keeping only the tail in memory."""
+
+    def __init__(self, log_dir: str, cluster_id: str, step_id: str, tail_lines: int = LOG_TAIL_LINES):
+        self.path = step_log_path(log_dir, cluster_id, step_id)
+        self.lines_written = 0
+        self._tail = deque(maxlen=tail_lines)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Truncate the log of a previous attempt of the step
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+
+    def write(self, lines: Iterable[str]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for line in lines:
+                f.write(line.rstrip('\n') + '\n')
+                self._tail.append(line.rstrip('\n'))
+                self.lines_written += 1
+
+    def failure_log_file(self) -> str:
+        """The value of FailureDetails.log_file, the tail of the log followed by where to find the rest of it."""
+        tail = list(self._tail)
+        if self.lines_written > len(tail):
+            tail.insert(0, '... {} earlier lines omitted'.format(self.lines_written - len(tail)))
+        return '\n'.join(tail + ['Full log: {}'.format(self.path)])
+
+
+def read_step_log(log_dir: str, cluster_id: str, step_id: str, start: int = 0, size: int = 100) -> List[str]:
+    """
+    Parameters
+    ----------
+    start : The index of the first line to read
+    size : The maximum number of lines to read
+
+    Returns
+    -------
+    The lines of the log in the range, without reading the rest of the file into memory.
+    Raises FileNotFoundError if the step has no log.
+    """
+    with open(step_log_path(log_dir, cluster_id, step_id), encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in islice(f, start, start + size)]
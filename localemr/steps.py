@@ -0,0 +1,115 @@
+"""
+The steps of a cluster are kept indexed by id, and secondarily by state, so that status updates,
+DescribeStep and ListSteps with StepStates don't have to scan the whole history of a long lived cluster.
+
+Once a cluster has terminated its steps never change again, and are compacted into ArchivedSteps
+holding only what the API returns.
+"""
+from collections import OrderedDict, defaultdict
+from itertools import count, islice
+from typing import Iterable, Iterator, List, Optional
+from moto.emr.models import FakeStep
+
+
+class ArchivedStep:
+    """A step which will never run again, with the attributes the response templates read and nothing else."""
+    __slots__ = (
+        'id', 'cluster_id', 'name', 'state', 'action_on_failure', 'jar', 'main_class', 'args', 'properties', 'failure_details',
+        'creation_datetime', 'ready_datetime', 'start_datetime', 'end_datetime', 'queue_wait_seconds',
+    )
+
+    def __init__(self, step: FakeStep):
+        for attribute in self.__slots__:
+            setattr(self, attribute, getattr(step, attribute, None))
+
+
+class StepStore:
+
+    def __init__(self, steps: Iterable[FakeStep] = ()):
+        self._steps = OrderedDict()
+        self._order = {}
+        self._states = {}
+        self._by_state = defaultdict(dict)
+        self._counter = count()
+        for step in steps:
+            self.append(step)
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    def __iter__(self) -> Iterator[FakeStep]:
+        # Over a copy, the responses render the steps without holding the lock of their cluster
+        return iter(list(self._steps.values()))
+
+    def __contains__(self, step_id) -> bool:
+        return step_id in self._steps
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(islice(self._steps.values(), index.start, index.stop, index.step))
+        if index < 0:
+            index += len(self._steps)
+        try:
+            return next(islice(self._steps.values(), index, None))
+        except StopIteration as e:
+            raise IndexError("StepStore index out of range") from e
+
+    def append(self, step: FakeStep):
+        self._steps[step.id] = step
+        self._order[step.id] = next(self._counter)
+        self._states[step.id] = step.state
+        self._by_state[step.state][step.id] = step
+
+    def update(self, step: FakeStep):
+        """
+        Replace the step with the same id, keeping its position, and reindex it by its current
+        state. Also used after mutating a stored step in place. Steps which are not in the store
+        are appended.
+        """
+        if step.id not in self._steps:
+            self.append(step)
+            return
+        self._by_state[self._states[step.id]].pop(step.id, None)
+        self._steps[step.id] = step
+        self._states[step.id] = step.state
+        self._by_state[step.state][step.id] = step
+
+    def compact(self):
+        """Archives every step, which must all have reached a final state."""
+        for step_id, step in self._steps.items():
+            archived_step = ArchivedStep(step)
+            self._steps[step_id] = archived_step
+            self._by_state[step.state][step_id] = archived_step
+
+    def get(self, step_id) -> Optional[FakeStep]:
+        return self._steps.get(step_id)
+
+    def position(self, step_id) -> int:
+        """Where the step is in the order the steps were added."""
+        return self._order[step_id]
+
+    def select(self, step_ids: Optional[List[str]] = None, step_states: Optional[List[str]] = None) -> List[FakeStep]:
+        """
+        Parameters
+        ----------
+        step_ids : Only return steps with these ids, if given
+        step_states : Only return steps in these states, if given
+
+        Returns
+        -------
+        The matching steps in the order they were added, the cost being proportional to the
+        number of candidates rather than the number of steps in the store.
+        """
+        if step_ids:
+            steps = (self._steps[step_id] for step_id in set(step_ids) if step_id in self._steps)
+            if step_states:
+                steps = (step for step in steps if step.state in step_states)
+            return self._sorted(steps)
+        if step_states:
+            return self._sorted(
+                step for state in set(step_states) for step in self._by_state.get(state, {}).values()
+            )
+        return list(self)
+
+    def _sorted(self, steps: Iterable[FakeStep]) -> List[FakeStep]:
+        return sorted(steps, key=lambda step: self._order[step.id])
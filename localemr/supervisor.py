@@ -0,0 +1,235 @@
+"""
+Rather than forking a process per cluster, the fork/exec work of every cluster is multiplexed onto a
+bounded pool of worker processes. Within a worker each cluster runs `run_fork_exec` in its own thread,
+as the work is mostly waiting on Docker and the exec backend. Workers are started on demand and are
+reused once the clusters assigned to them have terminated. A single supervisor is shared by the
+backends of every region, so the pool size bounds the whole server.
+
+Steps aren't sent to the workers as they are submitted, they are queued in the StepScheduler until
+the host has the capacity to run them.
+"""
+import logging
+import threading
+from datetime import datetime
+from multiprocessing import Process, Queue
+from typing import Dict, List, Optional, Set
+
+import pytz
+from localemr.collector import StatusCollector
+from localemr.common import (
+    ClusterSubset,
+    EmrClusterState,
+    EmrStepState,
+    FailureDetails,
+    LocalFakeStep,
+    StepStatusUpdate,
+    EMR_CLUSTER_TERMINAL_STATES,
+    EMR_STEP_TERMINAL_STATES,
+)
+from localemr.fork_exec import ClusterInbox, ForkExec, make_step_terminal, run_fork_exec
+from localemr.scheduler import StepScheduler
+
+
+def run_worker(fork_exec: ForkExec, inbox: Queue, step_status_queue: Queue, cluster_status_queue: Queue):
+    """
+    Route the (cluster_id, ClusterSubset | LocalFakeStep) messages of the inbox to the thread of
+    the cluster they are meant for. Steps of a cluster can arrive before the cluster itself is
+    started, these are held back until it is.
+    """
+    clusters = {}
+    held_back_steps = {}
+    while True:
+        message = inbox.get()
+        if message is None:
+            return
+        cluster_id, payload = message
+        if isinstance(payload, ClusterSubset):
+            for finished_cluster_id in [c for c, (thread, _) in clusters.items() if not thread.is_alive()]:
+                del clusters[finished_cluster_id]
+            if cluster_id not in clusters:
+                cluster_inbox = ClusterInbox()
+                cluster_inbox.put_cluster_subset(payload)
+                for step in held_back_steps.pop(cluster_id, []):
+                    cluster_inbox.put_step(step)
+                thread = threading.Thread(
+                    target=run_fork_exec,
+                    args=(fork_exec, cluster_id, cluster_inbox, step_status_queue, cluster_status_queue),
+                    daemon=True,
+                )
+                thread.start()
+                clusters[cluster_id] = (thread, cluster_inbox)
+            else:
+                clusters[cluster_id][1].put_cluster_subset(payload)
+        elif cluster_id in clusters:
+            clusters[cluster_id][1].put_step(payload)
+        else:
+            held_back_steps.setdefault(cluster_id, []).append(payload)
+
+
+class Worker:
+
+    def __init__(self, fork_exec: ForkExec, status_collector: StatusCollector):
+        self.inbox = Queue()
+        self.clusters = set()
+        self.process = Process(
+            target=run_worker,
+            args=(
+                fork_exec,
+                self.inbox,
+                status_collector.step_status_queue,
+                status_collector.cluster_status_queue,
+            ),
+            daemon=True,
+        )
+        self.process.start()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def send(self, cluster_id: str, payload):
+        self.inbox.put((cluster_id, payload))
+
+    def stop(self, timeout=5):
+        if self.is_alive():
+            self.inbox.put(None)
+            self.process.join(timeout)
+            if self.is_alive():
+                self.process.terminate()
+        self.process.join()
+        self.inbox.close()
+
+
+class Supervisor:
+
+    def __init__(self, fork_exec: ForkExec, pool_size: int, status_collector: StatusCollector,
+                 scheduler: Optional[StepScheduler] = None):
+        self.fork_exec = fork_exec
+        self.pool_size = max(pool_size, 1)
+        self.status_collector = status_collector
+        self.scheduler = scheduler or StepScheduler()
+        self._lock = threading.Lock()
+        self._workers: List[Worker] = []
+        self._assignments: Dict[str, Worker] = {}
+        # Clusters which terminated or were lost with their worker, anything submitted for them afterwards is rejected
+        self._finished: Set[str] = set()
+
+    def submit(self, cluster_id: str, payload):
+        """
+        Parameters
+        ----------
+        cluster_id : The id of the cluster the payload is for
+        payload : Either a ClusterSubset to start or terminate the cluster, or a LocalFakeStep to run on it
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            worker = self._assignments.get(cluster_id)
+            if worker is not None and not worker.is_alive():
+                self._reap_dead_workers()
+            if cluster_id in self._finished:
+                self._reject(cluster_id, payload)
+                return
+            if isinstance(payload, ClusterSubset):
+                self._assigned_worker(cluster_id).send(cluster_id, payload)
+                if payload.step_concurrency_level is not None:
+                    self._send_steps(self.scheduler.set_concurrency(cluster_id, payload.step_concurrency_level))
+            else:
+                self._send_steps(self.scheduler.enqueue(payload))
+
+    def release(self, cluster_id: str):
+        """Free the slot of a terminated cluster so that its worker can be given other clusters."""
+        with self._lock:
+            self._finished.add(cluster_id)
+            worker = self._assignments.pop(cluster_id, None)
+            if worker is not None:
+                worker.clusters.discard(cluster_id)
+            self._send_steps(self.scheduler.remove_cluster(cluster_id))
+
+    def forget(self, cluster_id: str):
+        """Drops a terminated cluster which the API no longer knows about."""
+        with self._lock:
+            self._finished.discard(cluster_id)
+
+    def release_if_terminal(self, cluster_subset: ClusterSubset):
+        """Passed to the StatusCollector as on_cluster_status."""
+        if cluster_subset.state in EMR_CLUSTER_TERMINAL_STATES:
+            self.release(cluster_subset.cluster_id)
+
+    def release_step_if_terminal(self, step_status_update: StepStatusUpdate):
+        """Passed to the StatusCollector as on_step_status, hands the resources of finished steps to queued ones."""
+        if step_status_update.state in EMR_STEP_TERMINAL_STATES + [EmrStepState.COMPLETED]:
+            with self._lock:
+                self._send_steps(self.scheduler.finish(step_status_update.cluster_id, step_status_update.id))
+
+    def occupancy(self) -> dict:
+        with self._lock:
+            self._reap_dead_workers()
+            return {
+                'pool_size': self.pool_size,
+                'workers': [
+                    {'pid': worker.process.pid, 'alive': worker.is_alive(), 'clusters': len(worker.clusters)}
+                    for worker in self._workers
+                ],
+                'scheduler': self.scheduler.usage(),
+            }
+
+    def stop(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._assignments = {}
+            self._finished = set()
+            self.scheduler.reset()
+
+    def _reject(self, cluster_id: str, payload):
+        logging.warning("Cluster %s has already terminated, dropping %s", cluster_id, type(payload).__name__)
+        if not isinstance(payload, ClusterSubset):
+            failure_details = FailureDetails(reason='Cluster terminated', message='The cluster terminated before the step could run')
+            self.status_collector.step_status_queue.put(make_step_terminal(payload, failure_details, EmrStepState.CANCELLED))
+
+    def _assigned_worker(self, cluster_id: str) -> Worker:
+        worker = self._assignments.get(cluster_id)
+        if worker is None:
+            worker = self._least_loaded_worker()
+            worker.clusters.add(cluster_id)
+            self._assignments[cluster_id] = worker
+        return worker
+
+    def _send_steps(self, steps: List[LocalFakeStep]):
+        for step in steps:
+            self._assigned_worker(step.cluster_id).send(step.cluster_id, step)
+
+    def _least_loaded_worker(self) -> Worker:
+        self._reap_dead_workers()
+        idle = [worker for worker in self._workers if not worker.clusters]
+        if idle:
+            return idle[0]
+        if len(self._workers) < self.pool_size:
+            self.fork_exec.start()
+            worker = Worker(self.fork_exec, self.status_collector)
+            self._workers.append(worker)
+            return worker
+        return min(self._workers, key=lambda w: len(w.clusters))
+
+    def _reap_dead_workers(self):
+        admitted_steps = []
+        for worker in [w for w in self._workers if not w.is_alive()]:
+            logging.error(
+                "Worker process %s exited with code %s, losing clusters: %s",
+                worker.process.pid, worker.process.exitcode, sorted(worker.clusters),
+            )
+            worker.stop()
+            self._workers.remove(worker)
+            for cluster_id in worker.clusters:
+                self._assignments.pop(cluster_id, None)
+                self._finished.add(cluster_id)
+                admitted_steps.extend(self.scheduler.remove_cluster(cluster_id))
+                self.status_collector.cluster_status_queue.put(ClusterSubset(
+                    cluster_id=cluster_id,
+                    state=EmrClusterState.TERMINATED_WITH_ERRORS,
+                    end_datetime=datetime.now(pytz.utc),
+                ))
+        self._send_steps(admitted_steps)
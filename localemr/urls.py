@@ -6,4 +6,9 @@ url_bases = [
     "https?://elasticmapreduce.(.+).amazonaws.com",
 ]
 
-url_paths = {"{0}/$": LocalElasticMapReduceResponse.dispatch}
+url_paths = {
+    "{0}/$": LocalElasticMapReduceResponse.dispatch,
+    "{0}/localemr/workers$": LocalElasticMapReduceResponse.worker_pool,
+    r"{0}/localemr/clusters/(?P<cluster_id>[\w-]+)/steps/(?P<step_id>[\w-]+)/queue$": LocalElasticMapReduceResponse.step_queue_wait,
+    r"{0}/localemr/clusters/(?P<cluster_id>[\w-]+)/steps/(?P<step_id>[\w-]+)/log$": LocalElasticMapReduceResponse.step_log,
+}
@@ -1,13 +1,10 @@
-import sys
-import argparse
-import moto.server as server
+import time
 
-# Replace moto emr with the custom emr implementation
-sys.modules['moto.emr.urls'] = __import__('localemr.urls')
+# Taken before anything else is imported, so that the startup time localemr logs includes its imports
+STARTED_AT = time.perf_counter()
+
+# pylint: disable=wrong-import-position
+from localemr.server import main  # noqa: E402
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Local AWS EMR - A local service that imitates AWS EMR ")
-    parser.add_argument('-p', '--port', help='Port to run the service on', type=int, default=3000)
-    parser.add_argument("-H", "--host", type=str, help="Which host to bind", default="0.0.0.0")
-    args = parser.parse_args()
-    server.main(['emr', '-H', args.host, '--port', str(args.port)])
+    main(started_at=STARTED_AT)
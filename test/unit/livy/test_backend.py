@@ -0,0 +1,92 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import requests
+from localemr.exec.livy.backend import LivyBatchMonitor, find_livy_batch
+from localemr.exec.livy.models import LivyState
+
+
+class FakeResponse:
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeLivySession:
+    """Every batch succeeds after being listed twice."""
+
+    def __init__(self, batch_ids):
+        self.sweeps = {batch_id: 0 for batch_id in batch_ids}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None):
+        with self.lock:
+            self.requests.append(url)
+            sessions = []
+            for batch_id in self.sweeps:
+                self.sweeps[batch_id] += 1
+                state = LivyState.SUCCESS if self.sweeps[batch_id] > 2 else LivyState.BUSY
+                sessions.append({'id': batch_id, 'name': 'step-{}'.format(batch_id), 'appId': None, 'appInfo': {}, 'log': [], 'state': state})
+            start, size = params['from'], params['size']
+            return FakeResponse({'from': start, 'total': len(sessions), 'sessions': sessions[start:start + size]})
+
+
+class FlakyLivySession(FakeLivySession):
+    """The listing fails the given number of times first, and fetching the hidden batches by themselves always fails."""
+
+    def __init__(self, batch_ids, listing_failures, hidden=()):
+        super().__init__(batch_ids)
+        self.listing_failures = listing_failures
+        self.hidden = set(hidden)
+
+    def get(self, url, params=None):
+        if not url.endswith('/batches'):
+            raise requests.ConnectionError('Connection reset by peer')
+        if self.listing_failures:
+            self.listing_failures -= 1
+            raise requests.ConnectionError('Connection reset by peer')
+        response = super().get(url, params)
+        response.body['sessions'] = [batch for batch in response.body['sessions'] if batch['id'] not in self.hidden]
+        return response
+
+
+def test_a_failed_batch_fetch_fails_only_its_batch():
+    session = FlakyLivySession([1, 2], listing_failures=2, hidden=[2])
+    monitor = LivyBatchMonitor(session, 'http://cluster:8998')
+    with ThreadPoolExecutor(2) as pool:
+        succeeded, failed = pool.submit(monitor.wait, 1), pool.submit(monitor.wait, 2)
+        assert succeeded.result(10).state == LivyState.SUCCESS
+        with pytest.raises(requests.ConnectionError):
+            failed.result(10)
+
+
+def test_batches_are_failed_once_the_listing_fails_too_many_times_in_a_row():
+    session = FlakyLivySession([1], listing_failures=3)
+    monitor = LivyBatchMonitor(session, 'http://cluster:8998', max_sweep_failures=3)
+    with pytest.raises(requests.ConnectionError):
+        monitor.wait(1)
+
+
+def test_outstanding_batches_are_refreshed_with_one_listing_per_sweep():
+    session = FakeLivySession(range(20))
+    monitor = LivyBatchMonitor(session, 'http://cluster:8998')
+    with ThreadPoolExecutor(20) as pool:
+        batches = list(pool.map(monitor.wait, range(20)))
+
+    assert [batch.id for batch in batches] == list(range(20))
+    assert {batch.state for batch in batches} == {LivyState.SUCCESS}
+    assert set(session.requests) == {'http://cluster:8998/batches'}
+    assert len(session.requests) < 20
+
+
+def test_a_resumed_step_finds_its_batch_by_name():
+    session = FakeLivySession(range(150))
+    assert find_livy_batch(session, 'http://test:8998', 'step-120').id == 120
+    assert find_livy_batch(session, 'http://test:8998', 'missing') is None
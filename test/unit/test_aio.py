@@ -0,0 +1,34 @@
+import asyncio
+import threading
+import time
+import pytest
+from localemr.common import EmrStepState, FailureDetails, LocalFakeStep, SparkResult
+from localemr.config import Configuration
+
+aio = pytest.importorskip('localemr.exec.aio.models')
+
+
+class SleepingExec(aio.AsyncExec):
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.threads = set()
+
+    async def run_step(self, emr_step):
+        assert emr_step.state == EmrStepState.PENDING
+        self.threads.add(threading.get_ident())
+        await asyncio.sleep(0.2)
+        return SparkResult(EmrStepState.COMPLETED, FailureDetails())
+
+
+def test_steps_of_every_cluster_share_one_event_loop():
+    exec_impl = SleepingExec(Configuration())
+    steps = [
+        LocalFakeStep('c{}'.format(i % 10), 'j-{}'.format(i % 10), 'c', state=EmrStepState.PENDING, jar='command-runner.jar')
+        for i in range(200)
+    ]
+    start = time.time()
+    futures = [exec_impl.submit(step) for step in steps]
+    assert {future.result(timeout=5).state for future in futures} == {EmrStepState.COMPLETED}
+    assert time.time() - start < 2
+    assert len(exec_impl.threads) == 1
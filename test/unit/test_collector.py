@@ -0,0 +1,65 @@
+import time
+from datetime import datetime
+from localemr.collector import StatusCollector
+from localemr.common import ClusterSubset, EmrClusterState, EmrStepState, StepStatusUpdate
+
+
+def drain_when_received(collector, cluster_id):
+    for _ in range(100):
+        updates = collector.drain([cluster_id])
+        if updates:
+            return updates[0]
+        time.sleep(0.05)
+    raise TimeoutError("Collector never received the update")
+
+
+def test_drain_only_returns_dirty_clusters():
+    collector = StatusCollector()
+    collector.start()
+    try:
+        step = StepStatusUpdate('j-1', 's-1', EmrStepState.RUNNING)
+        collector.step_status_queue.put(step)
+        collector.cluster_status_queue.put(ClusterSubset(cluster_id='j-2', state=EmrClusterState.WAITING))
+
+        assert not collector.drain(['j-3'])
+        cluster_id, step_updates, cluster_update = drain_when_received(collector, 'j-1')
+        assert cluster_id == 'j-1'
+        assert [s.id for s in step_updates] == [step.id]
+        assert cluster_update is None
+
+        cluster_id, step_updates, cluster_update = drain_when_received(collector, 'j-2')
+        assert cluster_id == 'j-2'
+        assert step_updates == []
+        assert cluster_update.state == EmrClusterState.WAITING
+        assert not collector.drain()
+    finally:
+        collector.stop()
+    assert not collector.started
+
+
+def test_updates_are_coalesced_until_drained():
+    collector = StatusCollector()
+    collector.start()
+    try:
+        step = StepStatusUpdate('j-1', 's-1', EmrStepState.RUNNING)
+        collector.step_status_queue.put(step)
+        collector.step_status_queue.put(StepStatusUpdate('j-1', 's-1', EmrStepState.COMPLETED))
+        started = datetime(2020, 1, 1)
+        collector.cluster_status_queue.put(ClusterSubset(cluster_id='j-1', state=EmrClusterState.STARTING, start_datetime=started))
+        for _ in range(10):
+            collector.cluster_status_queue.put(ClusterSubset(cluster_id='j-1', state=EmrClusterState.WAITING))
+        # Each queue is consumed in order, so once these arrive everything before them has been collected
+        collector.step_status_queue.put(StepStatusUpdate('j-marker', 's-marker', EmrStepState.PENDING))
+        collector.cluster_status_queue.put(ClusterSubset(cluster_id='j-marker', state=EmrClusterState.WAITING))
+        received_steps, received_cluster = False, False
+        while not (received_steps and received_cluster):
+            _, step_updates, cluster_update = drain_when_received(collector, 'j-marker')
+            received_steps = received_steps or bool(step_updates)
+            received_cluster = received_cluster or cluster_update is not None
+
+        _, step_updates, cluster_update = drain_when_received(collector, 'j-1')
+        assert [(s.id, s.state) for s in step_updates] == [(step.id, EmrStepState.COMPLETED)]
+        assert cluster_update.state == EmrClusterState.WAITING
+        assert cluster_update.start_datetime == started
+    finally:
+        collector.stop()
@@ -1,4 +1,5 @@
-from localemr.common import get_emr_version, clean_for_local_run
+import pickle
+from localemr.common import get_emr_version, clean_for_local_run, EmrStepState, FailureDetails, LocalFakeStep, StepStatusUpdate
 
 
 def test_clean_for_local_run():
@@ -34,3 +35,21 @@ def test_get_emr_version():
     assert get_emr_version('emr-5.26.0') == '5.25.0'
     assert get_emr_version('emr-0.0.0') == '5.0.0'
     assert get_emr_version('emr-7.0.0') == '6.0.0'
+
+
+def test_step_status_update_applies_to_the_step():
+    step = LocalFakeStep('test', 'j-1', 'test', state=EmrStepState.PENDING, jar='command-runner.jar', args=['--arg{}'.format(i) for i in range(1000)])
+    step.start()
+    step.state = EmrStepState.RUNNING
+    update = StepStatusUpdate.from_step(step)
+    assert len(pickle.dumps(update)) < len(pickle.dumps(step)) / 10
+
+    api_step = LocalFakeStep('test', 'j-1', 'test', state=EmrStepState.PENDING, jar='command-runner.jar')
+    pickle.loads(pickle.dumps(update)).apply(api_step)
+    assert api_step.state == EmrStepState.RUNNING
+    assert api_step.start_datetime == step.start_datetime
+
+    StepStatusUpdate('j-1', step.id, EmrStepState.FAILED, failure_details=FailureDetails(reason='Spark failed')).apply(api_step)
+    assert api_step.state == EmrStepState.FAILED
+    assert api_step.start_datetime == step.start_datetime
+    assert api_step.failure_details.reason == 'Spark failed'
@@ -0,0 +1,79 @@
+from unittest import mock
+from localemr.common import ClusterSubset, EmrClusterState
+from localemr.config import Configuration
+from localemr.fork.docker.images import ImageManager
+from localemr.fork.docker.models import Docker
+from localemr.sizing import ClusterSize
+
+
+def test_containers_are_created_in_the_network_resolved_once():
+    client = mock.MagicMock()
+    client.containers.get.return_value.attrs = {'NetworkSettings': {'Networks': {'localemr-net': {}}}}
+    fork = Docker(Configuration(), client)
+
+    for name in ['j-1', 'j-2']:
+        fork.provision_container('2.4.4', name, {})
+
+    assert client.containers.get.call_args_list == [mock.call('localemr')]
+    assert not client.networks.get.called
+    for run_call in client.containers.run.call_args_list:
+        assert run_call.kwargs['network'] == 'localemr-net'
+
+
+def test_standalone_clusters_get_a_master_and_a_worker_per_instance():
+    client = mock.MagicMock()
+    client.containers.get.return_value.attrs = {'NetworkSettings': {'Networks': {'localemr-net': {}}}}
+    config = Configuration()
+    config.spark_standalone = True
+    fork = Docker(config, client)
+    cluster = ClusterSubset(
+        EmrClusterState.STARTING, cluster_id='j-1', name='test', release_label='emr-5.27.0',
+        worker_count=2, size=ClusterSize(4, 8192),
+    )
+    fork.create_process(cluster, mock.MagicMock())
+
+    runs = client.containers.run.call_args_list
+    assert [run_call.kwargs['name'] for run_call in runs] == ['test', 'test-spark-master', 'test-spark-worker-0', 'test-spark-worker-1']
+    assert runs[0].kwargs['environment']['SPARK_MASTER'] == 'spark://test-spark-master:7077'
+    assert runs[2].kwargs['cpu_quota'] == 200000
+    assert '--cores 2 --memory 4096m' in runs[2].args[1]
+    assert cluster.spark_conf['spark.master'] == 'spark://test-spark-master:7077'
+
+
+def test_resizing_a_standalone_cluster_removes_the_last_workers():
+    client = mock.MagicMock()
+    client.containers.get.return_value.attrs = {'NetworkSettings': {'Networks': {'localemr-net': {}}}}
+    workers = [mock.MagicMock() for _ in range(3)]
+    for i, worker in enumerate(workers):
+        worker.name = 'test-spark-worker-{}'.format(i)
+    client.containers.list.return_value = [workers[2], workers[0], workers[1]]
+    config = Configuration()
+    config.spark_standalone = True
+    fork = Docker(config, client)
+    fork.resize_process(ClusterSubset(None, cluster_id='j-1', name='test', release_label='emr-5.27.0', worker_count=2, size=ClusterSize(2, 4096)))
+
+    assert workers[2].remove.called
+    assert not workers[0].remove.called
+    assert workers[1].update.call_args.kwargs['cpu_quota'] == 100000
+    assert client.containers.get.return_value.update.call_args.kwargs['mem_limit'] == '4096m'
+    assert not client.containers.run.called
+
+
+def test_a_cluster_is_only_reattached_to_its_own_running_container():
+    client = mock.MagicMock()
+    container = client.containers.get.return_value
+    container.status, container.labels = 'running', {'localemr.cluster-id': 'j-1'}
+    fork = Docker(Configuration(), client)
+    assert fork.reattach_process(ClusterSubset(EmrClusterState.STARTING, cluster_id='j-1', name='test', release_label='emr-5.27.0'))
+    assert not fork.reattach_process(ClusterSubset(EmrClusterState.STARTING, cluster_id='j-2', name='test', release_label='emr-5.27.0'))
+    container.status = 'exited'
+    assert not fork.reattach_process(ClusterSubset(EmrClusterState.STARTING, cluster_id='j-1', name='test', release_label='emr-5.27.0'))
+
+
+def test_images_are_only_pulled_ahead_when_asked_for():
+    with mock.patch.object(ImageManager, 'start') as start:
+        Docker(Configuration(), mock.MagicMock())
+        config = Configuration()
+        config.prepull_release_labels = ['emr-5.27.0']
+        Docker(config, mock.MagicMock())
+    assert start.call_args_list == [mock.call([]), mock.call(['2.4.4'])]
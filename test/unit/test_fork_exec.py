@@ -0,0 +1,149 @@
+import time
+import queue
+import threading
+from unittest import mock
+from localemr.config import Configuration
+from localemr.common import ClusterSubset, EmrClusterState, EmrStepState, FailureDetails, LocalFakeStep, SparkResult
+from localemr.exec.interface import ExecInterface
+from localemr.fork.interface import ForkInterface
+from localemr.fork_exec import ClusterInbox, ForkExec, StepExecutor, run_fork_exec
+
+
+class BlockingExec(ExecInterface):
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def exec_process(self, emr_step):
+        self.release.wait(10)
+        return SparkResult(EmrStepState.COMPLETED, FailureDetails())
+
+
+class FakeFork(ForkInterface):
+
+    def create_process(self, cluster, status_queue):
+        cluster.run_bootstrap_actions()
+        status_queue.put(cluster)
+
+    def terminate_process(self, cluster, status_queue):
+        cluster.run_termination_actions()
+        status_queue.put(cluster)
+
+
+class FakeForkExec:
+
+    def __init__(self, exec_impl):
+        self.fork = FakeFork()
+        self.exec = exec_impl
+
+
+def make_step():
+    return LocalFakeStep('test', 'j-1', 'test', state=EmrStepState.PENDING, jar='command-runner.jar')
+
+
+def test_step_executor_runs_up_to_concurrency_steps():
+    exec_impl = BlockingExec()
+    status_queue = queue.Queue()
+    executor = StepExecutor(exec_impl, status_queue, concurrency=2)
+
+    steps = [make_step(), make_step()]
+    for step in steps:
+        assert executor.has_capacity()
+        executor.submit(step)
+    assert not executor.has_capacity()
+
+    running = {status_queue.get(timeout=5).id for _ in steps}
+    assert running == {step.id for step in steps}
+
+    executor.set_concurrency(3)
+    assert executor.has_capacity()
+
+    exec_impl.release.set()
+    finished = [status_queue.get(timeout=5) for _ in steps]
+    assert {step.state for step in finished} == {EmrStepState.COMPLETED}
+
+
+def test_cluster_inbox_prioritizes_cluster_actions():
+    inbox = ClusterInbox()
+    step = make_step()
+    inbox.put_step(step)
+    inbox.put_cluster_subset(ClusterSubset(cluster_id='j-1', state=EmrClusterState.TERMINATING))
+
+    assert inbox.get(lambda: True).state == EmrClusterState.TERMINATING
+    # Without the capacity to take the step, get blocks until notified
+    threading.Timer(0.1, inbox.notify).start()
+    assert inbox.get(lambda: False) is None
+    assert inbox.get(lambda: True) is step
+    assert inbox.is_empty()
+
+
+def test_cluster_inbox_get_wakes_up_on_put():
+    inbox = ClusterInbox()
+    step = make_step()
+    threading.Timer(0.1, inbox.put_step, args=(step,)).start()
+    start = time.time()
+    assert inbox.get(lambda: True) is step
+    assert time.time() - start < 1
+
+
+def test_terminating_cancels_queued_steps_and_interrupts_running_ones():
+    exec_impl = BlockingExec()
+    inbox = ClusterInbox()
+    step_status_queue, cluster_status_queue = queue.Queue(), queue.Queue()
+    running, queued = make_step(), make_step()
+    inbox.put_cluster_subset(ClusterSubset(cluster_id='j-1', state=EmrClusterState.STARTING))
+    inbox.put_step(running)
+    inbox.put_step(queued)
+    thread = threading.Thread(
+        target=run_fork_exec,
+        args=(FakeForkExec(exec_impl), 'j-1', inbox, step_status_queue, cluster_status_queue),
+    )
+    thread.start()
+    assert step_status_queue.get(timeout=5).state == EmrStepState.RUNNING
+
+    inbox.put_cluster_subset(ClusterSubset(cluster_id='j-1', state=EmrClusterState.TERMINATING))
+    thread.join(5)
+    assert not thread.is_alive()
+    exec_impl.release.set()
+    time.sleep(0.1)
+
+    statuses = {}
+    while not step_status_queue.empty():
+        step = step_status_queue.get()
+        statuses.setdefault(step.id, []).append(step.state)
+    assert statuses == {queued.id: [EmrStepState.CANCELLED], running.id: [EmrStepState.INTERRUPTED]}
+
+
+def test_cluster_state_is_only_published_on_transitions():
+    exec_impl = BlockingExec()
+    inbox = ClusterInbox()
+    step_status_queue, cluster_status_queue = queue.Queue(), queue.Queue()
+    inbox.put_cluster_subset(ClusterSubset(cluster_id='j-1', state=EmrClusterState.STARTING))
+    thread = threading.Thread(
+        target=run_fork_exec,
+        args=(FakeForkExec(exec_impl), 'j-1', inbox, step_status_queue, cluster_status_queue),
+    )
+    thread.start()
+    assert cluster_status_queue.get(timeout=5).state == EmrClusterState.WAITING
+    for _ in range(3):
+        inbox.put_step(make_step())
+    for _ in range(10):
+        inbox.notify()
+    exec_impl.release.set()
+    assert cluster_status_queue.get(timeout=5).state == EmrClusterState.RUNNING
+    assert cluster_status_queue.get(timeout=5).state == EmrClusterState.WAITING
+    inbox.put_cluster_subset(ClusterSubset(cluster_id='j-1', state=EmrClusterState.TERMINATING))
+    thread.join(5)
+
+    assert cluster_status_queue.get(timeout=5).state == EmrClusterState.TERMINATED
+    assert cluster_status_queue.empty()
+    assert [step_status_queue.get().state for _ in range(6)].count(EmrStepState.COMPLETED) == 3
+
+
+def test_fork_exec_creates_its_implementations_on_first_use():
+    with mock.patch.object(ForkInterface, 'get_impl', return_value=FakeFork()) as get_impl:
+        fork_exec = ForkExec(Configuration())
+        assert not get_impl.called
+        fork = fork_exec.fork
+        assert fork_exec.fork is fork
+        assert get_impl.call_count == 1
@@ -0,0 +1,64 @@
+from docker.errors import ImageNotFound
+from localemr.fork.docker.images import ImageManager
+
+GB = 2 ** 30
+
+
+class FakeImage:
+
+    def __init__(self, size):
+        self.attrs = {'Size': size}
+
+
+class FakeImages:
+
+    def __init__(self, images):
+        self.images = images
+        self.pulled = []
+
+    def get(self, name):
+        if name not in self.images:
+            raise ImageNotFound(name)
+        return self.images[name]
+
+    def pull(self, name):
+        self.pulled.append(name)
+        self.images[name] = FakeImage(GB)
+        return self.images[name]
+
+    def remove(self, name):
+        del self.images[name]
+
+
+class FakeContainers:
+
+    def __init__(self, in_use):
+        self.in_use = in_use
+
+    def list(self, all, filters):  # pylint: disable=redefined-builtin
+        return [filters['ancestor']] if all and filters['ancestor'] in self.in_use else []
+
+
+class FakeClient:
+
+    def __init__(self, images, in_use=()):
+        self.images = FakeImages(images)
+        self.containers = FakeContainers(in_use)
+
+
+def test_ensure_pulls_missing_images_once():
+    client = FakeClient({})
+    manager = ImageManager('repo:spark', lambda: client)
+    assert manager.ensure('2.4.4') == 'repo:spark2.4.4'
+    assert manager.ensure('2.4.4') == 'repo:spark2.4.4'
+    assert client.images.pulled == ['repo:spark2.4.4']
+
+
+def test_evict_removes_least_recently_used_images_not_in_use():
+    images = {'repo:spark{}'.format(version): FakeImage(GB) for version in ['2.3.0', '2.4.0', '2.4.4', '2.4.5']}
+    client = FakeClient(images, in_use=['repo:spark2.3.0'])
+    manager = ImageManager('repo:spark', lambda: client, disk_budget_bytes=2 * GB)
+    for version in ['2.4.0', '2.4.5', '2.4.4']:
+        manager._mark_used('repo:spark' + version)  # pylint: disable=protected-access
+    manager.evict()
+    assert sorted(client.images.images) == ['repo:spark2.3.0', 'repo:spark2.4.4']
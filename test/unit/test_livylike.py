@@ -0,0 +1,49 @@
+from localemr.common import EmrStepState
+from localemr.exec.livylike.models import send_step_to_livylike
+from localemr.step_logs import StepLogSpool
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeLivyLikeSession:
+    """Knows of the batches it is given, each of which succeeds when it is next polled."""
+
+    def __init__(self, batch_ids):
+        self.batches = {batch_id: 'RUNNING' for batch_id in batch_ids}
+        self.posted = []
+
+    def get(self, url):
+        batch_id = url.rsplit('/', 1)[-1]
+        if batch_id not in self.batches:
+            return FakeResponse(200 if url.endswith('/health') else 404)
+        status, self.batches[batch_id] = self.batches[batch_id], 'SUCCEEDED'
+        return FakeResponse(200, {'status': status})
+
+    def post(self, url, json):
+        batch_id = url.rsplit('/', 1)[-1]
+        self.posted.append(batch_id)
+        self.batches[batch_id] = 'SUCCEEDED'
+        return FakeResponse(200, {'status': 'RUNNING', 'args': json['args']})
+
+
+def test_a_resumed_step_waits_on_its_batch_rather_than_running_again(tmp_path):
+    session = FakeLivyLikeSession(['s-1'])
+    result = send_step_to_livylike('test', 's-1', ['spark-submit'], StepLogSpool(str(tmp_path), 'j-1', 's-1'), session, resumed=True)
+    assert result.state == EmrStepState.COMPLETED
+    assert not session.posted
+
+    # The batch of a resumed step which never reached LivyLike is submitted
+    result = send_step_to_livylike('test', 's-2', ['spark-submit'], StepLogSpool(str(tmp_path), 'j-1', 's-2'), session, resumed=True)
+    assert result.state == EmrStepState.COMPLETED
+    assert session.posted == ['s-2']
@@ -0,0 +1,44 @@
+import threading
+import pytest
+from localemr.locks import RWLock
+
+
+def test_readers_share_the_lock_and_a_writer_waits_for_them():
+    lock = RWLock()
+    both_reading = threading.Barrier(2, timeout=5)
+    written = threading.Event()
+
+    def read():
+        with lock.read():
+            both_reading.wait()
+
+    def write():
+        with lock.write():
+            written.set()
+
+    with lock.read():
+        reader = threading.Thread(target=read)
+        reader.start()
+        both_reading.wait()
+        reader.join(5)
+        assert not reader.is_alive()
+        writer = threading.Thread(target=write)
+        writer.start()
+        assert not written.wait(0.2)
+    assert written.wait(5)
+    writer.join(5)
+
+
+def test_the_lock_is_reentrant_but_a_reader_cant_upgrade():
+    lock = RWLock()
+    with lock.write():
+        with lock.write():
+            with lock.read():
+                pass
+    with lock.read():
+        with lock.read():
+            with pytest.raises(RuntimeError):
+                with lock.write():
+                    pass
+    with lock.write():
+        pass
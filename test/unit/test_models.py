@@ -0,0 +1,128 @@
+import threading
+import time
+from datetime import datetime
+import pytest
+import pytz
+from localemr.collector import StatusCollector
+from localemr.common import ClusterSubset, EmrClusterState, EmrStepState, StepStatusUpdate
+from localemr.models import LocalElasticMapReduceBackend, RegionBackends
+
+
+def test_region_backends_are_built_on_first_access():
+    backends = RegionBackends()
+    assert 'eu-west-1' in backends
+    assert not list(backends.values())
+
+    backend = backends['eu-west-1']
+    assert isinstance(backend, LocalElasticMapReduceBackend)
+    assert backends.get('eu-west-1') is backend
+    assert list(backends.keys()) == ['eu-west-1']
+    assert 'nowhere-1' not in backends
+    assert backends.get('nowhere-1') is None
+
+
+class FakeSupervisor:
+
+    def submit(self, cluster_id, item):
+        pass
+
+    def forget(self, cluster_id):
+        pass
+
+
+@pytest.fixture(name='backend')
+def fake_backend():
+    backend = LocalElasticMapReduceBackend('us-east-1')
+    backend.supervisor = FakeSupervisor()
+    backend.status_collector = StatusCollector()
+    yield backend
+    backend.status_collector.stop()
+
+
+def run_cluster(backend: LocalElasticMapReduceBackend, name: str):
+    return backend.run_job_flow(
+        name=name,
+        log_uri='s3://logs',
+        job_flow_role='EMR_EC2_DefaultRole',
+        service_role='EMR_DefaultRole',
+        steps=[],
+        instance_attrs={'master_instance_type': 'm5.xlarge', 'instance_count': 1, 'keep_job_flow_alive_when_no_steps': True},
+        release_label='emr-5.27.0',
+    )
+
+
+def make_steps(count: int):
+    return [
+        {'name': 'step-{}'.format(i), 'jar': 'command-runner.jar', 'args': ['spark-submit', 'job.py'], 'action_on_failure': 'CONTINUE'}
+        for i in range(count)
+    ]
+
+
+def test_requests_on_a_cluster_dont_wait_for_another_cluster(backend):
+    busy, idle = run_cluster(backend, 'busy'), run_cluster(backend, 'idle')
+    step = backend.add_job_flow_steps(idle.id, make_steps(1))[0]
+    done = threading.Event()
+
+    def describe():
+        backend.describe_step(idle.id, step.id)
+        backend.list_steps(idle.id)
+        done.set()
+
+    with busy.lock:
+        thread = threading.Thread(target=describe)
+        thread.start()
+        assert done.wait(5)
+    thread.join(5)
+
+
+def test_the_backend_stays_consistent_under_concurrent_requests(backend):
+    errors = []
+    cluster_ids = []
+
+    def hammer(index):
+        try:
+            cluster = run_cluster(backend, 'cluster-{}'.format(index))
+            cluster_ids.append(cluster.id)
+            for _ in range(5):
+                for step in backend.add_job_flow_steps(cluster.id, make_steps(2)):
+                    backend.status_collector.step_status_queue.put(StepStatusUpdate(cluster.id, step.id, EmrStepState.COMPLETED))
+                    assert backend.describe_step(cluster.id, step.id).id == step.id
+                backend.list_steps(cluster.id)
+                backend.describe_job_flows()
+                backend.list_clusters()
+            # The steps and the cluster are collected from separate queues, the steps are waited on as the worker would
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and any(step.state != EmrStepState.COMPLETED for step in backend.list_steps(cluster.id)[0]):
+                time.sleep(0.01)
+            backend.terminate_job_flows([cluster.id])
+            backend.status_collector.cluster_status_queue.put(ClusterSubset(EmrClusterState.TERMINATED, cluster_id=cluster.id))
+        # pylint: disable=broad-except
+        except Exception as e:
+            errors.append(e)
+
+    def reap(stop):
+        while not stop.is_set():
+            backend.terminate_idle_clusters(datetime.now(pytz.utc))
+            backend.evict_terminated_clusters(datetime.now(pytz.utc))
+
+    stop = threading.Event()
+    reaper = threading.Thread(target=reap, args=(stop,))
+    reaper.start()
+    threads = [threading.Thread(target=hammer, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    stop.set()
+    reaper.join(10)
+
+    assert not errors
+    assert len(cluster_ids) == 16
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and any(backend.get_cluster(cluster_id).state != EmrClusterState.TERMINATED for cluster_id in cluster_ids):
+        time.sleep(0.05)
+    for cluster_id in cluster_ids:
+        steps = backend.clusters[cluster_id].steps
+        assert len(list(steps)) == 10
+        assert all(step.state == EmrStepState.COMPLETED for step in steps)
+        assert backend.get_cluster(cluster_id).state == EmrClusterState.TERMINATED
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytz
+from localemr.persistence import ClusterRegistry, StateStore
+
+
+def test_saves_are_queryable_after_a_restart(tmp_path):
+    path = str(tmp_path / 'state.db')
+    now = datetime.now(pytz.utc)
+    store = StateStore(path)
+    store.put_cluster('us-east-1', 'j-2', 'WAITING', now, None, {'name': 'waiting'})
+    store.put_cluster('us-east-1', 'j-1', 'TERMINATED', now - timedelta(hours=1), now, {'name': 'first'})
+    store.put_cluster('us-east-1', 'j-1', 'TERMINATED', now - timedelta(hours=1), now, {'name': 'terminated'})
+    store.put_cluster('eu-west-1', 'j-3', 'WAITING', now, None, {'name': 'elsewhere'})
+    store.put_step('j-2', 's-2', 1, 'PENDING', 'second')
+    store.put_step('j-2', 's-1', 0, 'COMPLETED', 'first')
+    store.close()
+
+    store = StateStore(path)
+    assert store.get_cluster('us-east-1', 'j-1') == {'name': 'terminated'}
+    assert store.get_cluster('us-east-1', 'j-3') is None
+    assert store.get_steps('j-2') == ['first', 'second']
+    assert store.cluster_ids('us-east-1') == ['j-1', 'j-2']
+    assert store.cluster_ids('us-east-1', ['WAITING']) == ['j-2']
+    assert store.cluster_ids('us-east-1', created_after=now - timedelta(minutes=1)) == ['j-2']
+    assert store.cluster_ids('us-east-1', offset=1, limit=1) == ['j-2']
+    assert store.ended_clusters('us-east-1', ['TERMINATED']) == [('j-1', now.timestamp())]
+
+    store.delete_clusters(['j-2'])
+    assert store.get_steps('j-2') == []
+    assert store.cluster_ids('us-east-1') == ['j-1']
+    store.close()
+
+
+def test_registry_loads_missing_clusters():
+    loaded = []
+
+    def load(cluster_id):
+        if cluster_id != 'j-saved':
+            return None
+        loaded.append(cluster_id)
+        registry[cluster_id] = 'cluster'
+        return 'cluster'
+
+    registry = ClusterRegistry(load)
+    assert 'j-unknown' not in registry
+    assert registry.get('j-unknown') is None
+    assert list(registry.values()) == []
+    assert registry['j-saved'] == 'cluster'
+    assert 'j-saved' in registry
+    assert loaded == ['j-saved']
@@ -0,0 +1,30 @@
+import time
+from datetime import datetime
+from unittest import mock
+
+import pytz
+from localemr.reaper import ClusterReaper
+
+
+def test_reap_terminates_idle_clusters_of_every_backend():
+    backends = [mock.MagicMock(), mock.MagicMock()]
+    backends[0].terminate_idle_clusters.return_value = ['j-1']
+    backends[1].terminate_idle_clusters.return_value = []
+    backends[1].evict_terminated_clusters.return_value = ['j-2']
+    now = datetime.now(pytz.utc)
+
+    assert ClusterReaper(lambda: backends).reap(now) == ['j-1']
+    for backend in backends:
+        backend.terminate_idle_clusters.assert_called_once_with(now)
+        backend.evict_terminated_clusters.assert_called_once_with(now)
+
+
+def test_reaper_keeps_going_when_a_check_fails():
+    backend = mock.MagicMock()
+    backend.terminate_idle_clusters.side_effect = lambda now: [] if backend.terminate_idle_clusters.call_count > 1 else 1 / 0
+    reaper = ClusterReaper(lambda: [backend], interval=0.01)
+    reaper.start()
+    time.sleep(0.1)
+    reaper.stop()
+
+    assert backend.terminate_idle_clusters.call_count >= 2
@@ -0,0 +1,62 @@
+import threading
+import boto3
+from localemr.collector import StatusCollector
+from localemr.common import ClusterSubset
+from localemr.models import LocalElasticMapReduceBackend, emr_backends
+from localemr.server import LocalEmrServer, RequestHandler
+
+
+class RecordingSupervisor:
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, cluster_id, item):
+        self.submitted.append((cluster_id, item))
+
+    def forget(self, cluster_id):
+        pass
+
+
+def test_run_job_flow_starts_the_cluster_once_its_instance_groups_are_added():
+    # Requests to an endpoint other than AWS's are served by the backend of moto's default region
+    backend = LocalElasticMapReduceBackend('us-east-1')
+    backend.supervisor = RecordingSupervisor()
+    backend.status_collector = StatusCollector()
+    previous_backend = dict.pop(emr_backends, 'us-east-1', None)
+    emr_backends['us-east-1'] = backend
+    server = LocalEmrServer(('127.0.0.1', 0), RequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        emr = boto3.client(
+            'emr', region_name='us-east-1', endpoint_url='http://127.0.0.1:{}'.format(server.server_address[1]),
+            aws_access_key_id='testing', aws_secret_access_key='testing',
+        )
+        cluster_id = emr.run_job_flow(
+            Name='test',
+            ReleaseLabel='emr-5.27.0',
+            Instances={
+                'InstanceGroups': [
+                    {'InstanceRole': 'MASTER', 'InstanceType': 'm5.xlarge', 'InstanceCount': 1},
+                    {'InstanceRole': 'CORE', 'InstanceType': 'm5.xlarge', 'InstanceCount': 2},
+                ],
+                'KeepJobFlowAliveWhenNoSteps': True,
+            },
+            StepConcurrencyLevel=3,
+            Tags=[{'Key': 'team', 'Value': 'data'}],
+        )['JobFlowId']
+    finally:
+        server.shutdown()
+        server.server_close()
+        del emr_backends['us-east-1']
+        if previous_backend is not None:
+            emr_backends['us-east-1'] = previous_backend
+        backend.status_collector.stop()
+
+    submitted_id, cluster_subset = backend.supervisor.submitted[0]
+    assert submitted_id == cluster_id
+    assert isinstance(cluster_subset, ClusterSubset)
+    assert cluster_subset.worker_count == 2
+    assert cluster_subset.step_concurrency_level == 3
+    cluster = backend.clusters[cluster_id]
+    assert cluster.tags == {'team': 'data'}
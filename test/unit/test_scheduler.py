@@ -0,0 +1,54 @@
+from localemr.common import ActionOnFailure, EmrStepState, LocalFakeStep
+from localemr.scheduler import StepDemand, StepScheduler
+
+
+def make_step(cluster_id, args=None, action_on_failure=ActionOnFailure.CONTINUE):
+    return LocalFakeStep(
+        'test', cluster_id, 'test',
+        state=EmrStepState.PENDING,
+        jar='command-runner.jar',
+        args=['spark-submit'] + (args or []) + ['app.py'],
+        action_on_failure=action_on_failure,
+    )
+
+
+def test_step_demand_is_read_from_spark_submit_args():
+    demand = StepDemand.from_args(['spark-submit', '--num-executors', '3', '--executor-memory', '2g',
+                                   '--conf', 'spark.executor.cores=2', 'app.py'])
+    assert (demand.cores, demand.memory_mb) == (7, 7168)
+    default = StepDemand.from_args(['spark-submit', 'app.py'])
+    assert (default.cores, default.memory_mb) == (3, 3072)
+
+
+def test_capacity_is_shared_fairly_between_clusters():
+    scheduler = StepScheduler(max_steps=2)
+    busy = [make_step('j-busy') for _ in range(3)]
+    scheduler.set_concurrency('j-busy', 3)
+    assert scheduler.enqueue(busy[0]) == [busy[0]]
+    assert scheduler.enqueue(busy[1]) == [busy[1]]
+    assert scheduler.enqueue(busy[2]) == []
+
+    quiet = make_step('j-quiet')
+    assert scheduler.enqueue(quiet) == []
+    assert scheduler.usage()['queued'] == {'j-busy': 1, 'j-quiet': 1}
+    # The cluster running nothing goes first, even though the busy cluster queued its step earlier
+    assert scheduler.finish('j-busy', busy[0].id) == [quiet]
+    assert scheduler.finish('j-busy', busy[1].id) == [busy[2]]
+    assert busy[2].admitted_datetime is not None
+
+
+def test_steps_wait_for_memory_and_their_cluster_concurrency():
+    scheduler = StepScheduler(max_memory_mb=4096)
+    large = make_step('j-1', ['--executor-memory', '4g'])
+    small = make_step('j-2')
+    terminating = make_step('j-3', action_on_failure=ActionOnFailure.TERMINATE_CLUSTER)
+    # A step asking for more than the limit still runs when nothing else does
+    assert scheduler.enqueue(large) == [large]
+    assert scheduler.enqueue(small) == []
+    assert scheduler.enqueue(terminating) == []
+    assert scheduler.finish('j-1', large.id) == [terminating]
+
+    second = make_step('j-3')
+    assert scheduler.enqueue(second) == []
+    assert scheduler.remove_cluster('j-3') == [small]
+    assert scheduler.usage()['running'] == {'steps': 1, 'cores': 3, 'memory_mb': 3072}
@@ -0,0 +1,51 @@
+import io
+import threading
+from wsgiref.util import setup_testing_defaults
+import boto3
+from localemr.server import LocalEmrServer, RequestHandler, application
+
+
+class CountingServer(LocalEmrServer):
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+def test_boto_calls_share_a_kept_alive_connection():
+    server = CountingServer(('127.0.0.1', 0), RequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        emr = boto3.client(
+            'emr', region_name='us-west-2', endpoint_url='http://127.0.0.1:{}'.format(server.server_address[1]),
+            aws_access_key_id='testing', aws_secret_access_key='testing',
+        )
+        for _ in range(3):
+            assert emr.list_clusters()['Clusters'] == []
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert server.connections == 1
+
+
+def test_wsgi_app_serves_only_the_emr_routes():
+    responses = []
+
+    def start_response(status, headers):
+        responses.append((status, dict(headers)))
+
+    environ = {'REQUEST_METHOD': 'POST', 'PATH_INFO': '/', 'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+               'CONTENT_LENGTH': '19', 'wsgi.input': io.BytesIO(b'Action=ListClusters')}
+    setup_testing_defaults(environ)
+    body = b''.join(application(environ, start_response))
+    assert responses[-1][0] == '200 OK'
+    assert b'ListClustersResult' in body
+
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/s3/bucket'}
+    setup_testing_defaults(environ)
+    application(environ, start_response)
+    assert responses[-1][0] == '404 Not Found'
@@ -0,0 +1,16 @@
+from itertools import islice
+from localemr.exec.sessions import ClusterSessions, poll_intervals
+
+
+def test_poll_intervals_back_off_to_the_maximum():
+    intervals = list(islice(poll_intervals(initial=0.2, maximum=1.0, factor=2), 5))
+    assert intervals == [0.2, 0.4, 0.8, 1.0, 1.0]
+
+
+def test_sessions_are_reused_per_cluster_until_closed():
+    sessions = ClusterSessions()
+    session = sessions.get('cluster-1')
+    assert sessions.get('cluster-1') is session
+    assert sessions.get('cluster-2') is not session
+    sessions.close('cluster-1')
+    assert sessions.get('cluster-1') is not session
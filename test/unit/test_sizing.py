@@ -0,0 +1,25 @@
+from localemr.common import with_spark_conf
+from localemr.sizing import ClusterSize, instance_type_resources
+
+
+def test_instance_type_resources():
+    assert instance_type_resources('m5.xlarge') == (4, 16.0)
+    assert instance_type_resources('r5.2xlarge') == (8, 64.0)
+    assert instance_type_resources('c5.large') == (2, 4.0)
+    assert instance_type_resources('not-an-instance') == (4, 16.0)
+
+
+def test_cluster_size_is_scaled_from_its_instances():
+    size = ClusterSize.from_instances([('m5.xlarge', 1), ('m5.2xlarge', 2)], 0.1)
+    assert (size.cores, size.memory_mb) == (2.0, 8192)
+    assert size.docker_limits() == {'cpu_period': 100000, 'cpu_quota': 200000, 'mem_limit': '8192m', 'memswap_limit': '8192m'}
+    assert size.spark_conf()['spark.default.parallelism'] == '2'
+    assert size.spark_conf()['spark.driver.memory'] == '6144m'
+    tiny = ClusterSize.from_instances([('m5.xlarge', 1)], 0.01)
+    assert (tiny.cores, tiny.memory_mb) == (0.5, 1024)
+
+
+def test_the_cluster_spark_conf_is_overridden_by_the_step():
+    cli_args = with_spark_conf(['spark-submit', '--conf', 'spark.default.parallelism=8', 'app.py'], {'spark.default.parallelism': '2'})
+    assert cli_args == ['spark-submit', '--conf', 'spark.default.parallelism=2', '--conf', 'spark.default.parallelism=8', 'app.py']
+    assert with_spark_conf(['bash', 'script.sh'], {'spark.default.parallelism': '2'}) == ['bash', 'script.sh']
@@ -0,0 +1,26 @@
+from localemr.step_logs import StepLogSpool, read_step_log
+
+
+def test_spool_keeps_only_the_tail_in_memory(tmp_path):
+    spool = StepLogSpool(str(tmp_path), 'j-1', 's-1', tail_lines=3)
+    spool.write('line {}'.format(i) for i in range(5))
+    spool.write(['line 5\n'])
+
+    assert spool.lines_written == 6
+    assert spool.failure_log_file().split('\n') == [
+        '... 3 earlier lines omitted',
+        'line 3',
+        'line 4',
+        'line 5',
+        'Full log: {}'.format(spool.path),
+    ]
+    assert read_step_log(str(tmp_path), 'j-1', 's-1', start=4, size=10) == ['line 4', 'line 5']
+    assert read_step_log(str(tmp_path), 'j-1', 's-1', start=1, size=2) == ['line 1', 'line 2']
+
+
+def test_spool_truncates_the_log_of_a_previous_attempt(tmp_path):
+    StepLogSpool(str(tmp_path), 'j-1', 's-1').write(['first attempt'])
+    spool = StepLogSpool(str(tmp_path), 'j-1', 's-1')
+    spool.write(['second attempt'])
+    assert read_step_log(str(tmp_path), 'j-1', 's-1') == ['second attempt']
+    assert spool.failure_log_file().startswith('second attempt\n')
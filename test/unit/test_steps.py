@@ -0,0 +1,67 @@
+from copy import copy
+from localemr.common import LocalFakeStep, EmrStepState
+from localemr.steps import StepStore
+
+
+def make_step(state=EmrStepState.PENDING):
+    return LocalFakeStep('test', 'j-1', 'test', state=state, jar='command-runner.jar')
+
+
+def test_update_keeps_position_and_reindexes_state():
+    steps = [make_step() for _ in range(3)]
+    store = StepStore(steps)
+
+    updated = copy(steps[1])
+    updated.state = EmrStepState.RUNNING
+    store.update(updated)
+
+    assert [step.id for step in store] == [step.id for step in steps]
+    assert store.get(steps[1].id) is updated
+    assert store.select(step_states=[EmrStepState.RUNNING]) == [updated]
+    assert store.select(step_states=[EmrStepState.PENDING]) == [steps[0], steps[2]]
+
+
+def test_update_after_mutating_in_place():
+    step = make_step()
+    store = StepStore([step])
+    step.state = EmrStepState.COMPLETED
+    store.update(step)
+    assert not store.select(step_states=[EmrStepState.PENDING])
+    assert store.select(step_states=[EmrStepState.COMPLETED]) == [step]
+
+
+def test_select_preserves_insertion_order():
+    steps = [make_step() for _ in range(4)]
+    store = StepStore(steps)
+    for step, state in zip(steps, [EmrStepState.COMPLETED, EmrStepState.FAILED, EmrStepState.COMPLETED, EmrStepState.PENDING]):
+        step.state = state
+        store.update(step)
+
+    assert store.select(step_states=[EmrStepState.FAILED, EmrStepState.COMPLETED]) == steps[:3]
+    assert store.select(step_ids=[steps[3].id, steps[0].id]) == [steps[0], steps[3]]
+    assert store.select(step_ids=[steps[3].id, steps[0].id], step_states=[EmrStepState.PENDING]) == [steps[3]]
+    assert store.select(step_ids=['s-missing']) == []
+    assert store.select() == steps
+
+
+def test_positional_access():
+    steps = [make_step() for _ in range(3)]
+    store = StepStore(steps)
+    assert store[0] is steps[0]
+    assert store[-1] is steps[2]
+    assert store[1:] == steps[1:]
+    assert len(store) == 3
+    assert not StepStore()
+
+
+def test_compact_archives_steps_in_place():
+    steps = [make_step(EmrStepState.COMPLETED), make_step(EmrStepState.CANCELLED)]
+    store = StepStore(steps)
+    store.compact()
+
+    archived = store.get(steps[1].id)
+    assert not isinstance(archived, LocalFakeStep)
+    assert [step.id for step in store] == [step.id for step in steps]
+    assert (archived.state, archived.jar) == (EmrStepState.CANCELLED, 'command-runner.jar')
+    assert archived.queue_wait_seconds is not None
+    assert store.select(step_states=[EmrStepState.CANCELLED]) == [archived]
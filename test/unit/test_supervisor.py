@@ -0,0 +1,115 @@
+import os
+import signal
+import time
+from localemr.collector import StatusCollector
+from localemr.common import (
+    ClusterSubset,
+    EmrClusterState,
+    EmrStepState,
+    FailureDetails,
+    LocalFakeStep,
+    SparkResult,
+)
+from localemr.exec.interface import ExecInterface
+from localemr.fork.interface import ForkInterface
+from localemr.supervisor import Supervisor
+
+
+class FakeFork(ForkInterface):
+
+    def create_process(self, cluster, status_queue):
+        cluster.run_bootstrap_actions()
+        status_queue.put(cluster)
+
+    def terminate_process(self, cluster, status_queue):
+        cluster.run_termination_actions()
+        status_queue.put(cluster)
+
+
+class FakeExec(ExecInterface):
+
+    def exec_process(self, emr_step):
+        return SparkResult(EmrStepState.COMPLETED, FailureDetails())
+
+
+class FakeForkExec:
+
+    def __init__(self):
+        self.fork = FakeFork()
+        self.exec = FakeExec()
+
+    def start(self):
+        pass
+
+
+def wait_for(collector, cluster_id, predicate, timeout=30):
+    received = []
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        for _, step_updates, cluster_update in collector.drain([cluster_id]):
+            received.extend(step_updates + [cluster_update])
+        if any(predicate(message) for message in received):
+            return received
+        time.sleep(0.05)
+    raise TimeoutError("Never received the expected status for {}".format(cluster_id))
+
+
+def test_clusters_share_workers_and_slots_are_reused():
+    collector = StatusCollector()
+    supervisor = Supervisor(FakeForkExec(), 1, collector)
+    collector.on_cluster_status = supervisor.release_if_terminal
+    collector.on_step_status = supervisor.release_step_if_terminal
+    collector.start()
+    try:
+        step = LocalFakeStep('c1', 'j-1', 'c1', state=EmrStepState.PENDING, jar='command-runner.jar')
+        # Steps submitted before the cluster is started are held back until it is
+        supervisor.submit('j-1', step)
+        supervisor.submit('j-1', ClusterSubset(cluster_id='j-1', name='c1', state=EmrClusterState.STARTING))
+        supervisor.submit('j-2', ClusterSubset(cluster_id='j-2', name='c2', state=EmrClusterState.STARTING))
+
+        wait_for(collector, 'j-1', lambda m: getattr(m, 'id', None) == step.id and m.state == EmrStepState.COMPLETED)
+        occupancy = supervisor.occupancy()
+        assert occupancy['pool_size'] == 1
+        assert [worker['clusters'] for worker in occupancy['workers']] == [2]
+
+        for cluster_id in ('j-1', 'j-2'):
+            supervisor.submit(cluster_id, ClusterSubset(cluster_id=cluster_id, state=EmrClusterState.TERMINATING))
+            wait_for(collector, cluster_id, lambda m: getattr(m, 'state', None) == EmrClusterState.TERMINATED)
+        assert [worker['clusters'] for worker in supervisor.occupancy()['workers']] == [0]
+
+        pid = supervisor.occupancy()['workers'][0]['pid']
+        supervisor.submit('j-3', ClusterSubset(cluster_id='j-3', name='c3', state=EmrClusterState.STARTING))
+        assert [(w['pid'], w['clusters']) for w in supervisor.occupancy()['workers']] == [(pid, 1)]
+
+        # Steps for a terminated cluster are cancelled rather than taking up a slot
+        late_step = LocalFakeStep('c1', 'j-1', 'c1', state=EmrStepState.PENDING, jar='command-runner.jar')
+        supervisor.submit('j-1', late_step)
+        wait_for(collector, 'j-1', lambda m: getattr(m, 'id', None) == late_step.id and m.state == EmrStepState.CANCELLED)
+        assert [w['clusters'] for w in supervisor.occupancy()['workers']] == [1]
+    finally:
+        supervisor.stop()
+        collector.stop()
+
+
+def test_clusters_of_a_dead_worker_are_terminated_with_errors():
+    collector = StatusCollector()
+    supervisor = Supervisor(FakeForkExec(), 1, collector)
+    collector.on_cluster_status = supervisor.release_if_terminal
+    collector.on_step_status = supervisor.release_step_if_terminal
+    collector.start()
+    try:
+        supervisor.submit('j-1', ClusterSubset(cluster_id='j-1', name='c1', state=EmrClusterState.STARTING))
+        wait_for(collector, 'j-1', lambda m: getattr(m, 'state', None) == EmrClusterState.WAITING)
+        worker_pid = supervisor.occupancy()['workers'][0]['pid']
+        os.kill(worker_pid, signal.SIGKILL)
+        while supervisor.occupancy()['workers']:
+            time.sleep(0.05)
+
+        wait_for(collector, 'j-1', lambda m: getattr(m, 'state', None) == EmrClusterState.TERMINATED_WITH_ERRORS)
+        step = LocalFakeStep('c1', 'j-1', 'c1', state=EmrStepState.PENDING, jar='command-runner.jar')
+        supervisor.submit('j-1', step)
+        wait_for(collector, 'j-1', lambda m: getattr(m, 'id', None) == step.id and m.state == EmrStepState.CANCELLED)
+        assert not supervisor.occupancy()['workers']
+    finally:
+        supervisor.stop()
+        collector.stop()
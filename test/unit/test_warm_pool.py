@@ -0,0 +1,49 @@
+from localemr.fork.docker.warm_pool import WarmPool, WARM_POOL_LABEL
+
+
+class FakeContainer:
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def rename(self, name):
+        self.name = name
+
+
+class FakeContainers:
+
+    def __init__(self):
+        self.containers = []
+
+    def list(self, filters):
+        key, value = filters['label'].split('=')
+        return [container for container in self.containers if container.labels.get(key) == value]
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.containers = FakeContainers()
+
+    def provision(self, _spark_version, name, labels):
+        container = FakeContainer(name, labels)
+        self.containers.containers.append(container)
+        return container
+
+
+def test_claim_renames_an_idle_container_until_the_pool_is_empty():
+    client = FakeClient()
+    pool = WarmPool(2, ['2.4.4', '2.4.4', '3.0.0'], lambda: client, client.provision)
+    pool.refill()
+    assert len(client.containers.containers) == 4
+
+    first = pool.claim('2.4.4', 'j-1')
+    second = pool.claim('2.4.4', 'j-2')
+    assert (first.name, second.name) == ('j-1', 'j-2')
+    assert first.labels == {WARM_POOL_LABEL: '2.4.4'}
+    assert pool.claim('2.4.4', 'j-3') is None
+
+    pool.refill()
+    assert len(client.containers.containers) == 6
+    assert pool.claim('2.4.4', 'j-3').name == 'j-3'